@@ -0,0 +1,297 @@
+# Timing code properly is harder than it looks.
+# The first few runs are often slower while caches warm up, other programs on the machine can slow down any single run,
+# and one total time doesn't tell us whether a difference between two runs is real or just noise.
+#
+# This module is a small benchmark runner that takes care of that for us:
+#   * Functions are registered as cases with the register decorator
+#   * Each case is run a few times to warm up before we start timing it
+#   * It's then timed many times, and we report the median along with a 95% confidence interval for it
+#   * We also record the most memory the case allocated at once, and how many items per second it handled
+#   * The results can be saved as JSON, and compared against a baseline saved earlier
+#
+# To run every registered case in mayapy, saving the results and failing if anything is more than 10% slower:
+#   mayapy -m Intro.benchmark --output results.json --baseline baseline.json --threshold 0.1
+#
+# Or to run just some of them, by name:
+#   mayapy -m Intro.benchmark callbacks.100 callbacks.10000
+from __future__ import division, print_function
+
+import argparse
+import gc
+import importlib
+import json
+import math
+import platform
+import sys
+import time
+import timeit
+from collections import OrderedDict
+
+# perf_counter is the most precise clock, but it's only in Python 3. default_timer is the best one in Python 2
+perfCounter = getattr(time, 'perf_counter', timeit.default_timer)
+
+try:
+    # resource gives us the peak memory of the process, but it isn't available on Windows
+    import resource
+except ImportError:
+    resource = None
+
+# tracemalloc lets us measure the memory a single case allocates, but it only exists in Python 3
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# The registered cases, in the order they were registered
+cases = OrderedDict()
+
+# The modules that register cases. They're imported when the benchmarks are run from the command line
+# Scene.locatorBenchmark registers cases too, but it needs a viewport, so it can only be run inside Maya itself
+kCaseModules = [
+    'Intro.standalone',
+    'Utilities.callbackBenchmark',
+    'Utilities.createdNodesBenchmark',
+    'Nodes.pushBenchmark',
+]
+
+# By default a case has to be this much slower than the baseline to count as a regression
+kDefaultThreshold = 0.1
+
+
+class Case(object):
+    """A function to benchmark along with how to run it"""
+
+    def __init__(self, name, function, setup=None, teardown=None, warmup=3, repeat=50, number=1, items=None):
+        """
+        :param name: The name to report the results under
+        :param function: The function to time. It's called with whatever setup returns
+        :param setup: An optional function that's called once before the case runs, which isn't timed
+        :param teardown: An optional function that's called with whatever setup returned once the case is done
+        :param warmup: How many times to call the function before we start timing it
+        :param repeat: How many timings to take
+        :param number: How many times to call the function in each timing. Use more for very quick functions
+        :param items: How many things, like vertices, each call handles, so we can report how many it does per second
+        """
+        self.name = name
+        self.function = function
+        self.setup = setup
+        self.teardown = teardown
+        self.warmup = warmup
+        self.repeat = repeat
+        self.number = number
+        self.items = items
+
+
+def register(name=None, **kwargs):
+    """
+    A decorator that registers a function as a benchmark case.
+    Any keyword arguments are passed on to Case.
+    """
+
+    def decorator(function):
+        caseName = name or function.__name__
+        cases[caseName] = Case(caseName, function, **kwargs)
+        return function
+
+    return decorator
+
+
+def processPeakMemory():
+    """
+    Returns the most memory the process has used so far in bytes, or None if we can't tell.
+    This never goes down, so after a big case every case after it reports the same.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports it in kilobytes but macOS reports it in bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def medianInterval(samples, z=1.96):
+    """
+    Returns the median of the samples and a confidence interval for it, 95% by default.
+    We use the ranks of the sorted samples rather than assuming the timings follow a normal distribution,
+    since timings usually have a long tail of slow runs.
+    """
+    samples = sorted(samples)
+    count = len(samples)
+    middle = count // 2
+    median = samples[middle] if count % 2 else (samples[middle - 1] + samples[middle]) / 2
+
+    offset = z * math.sqrt(count) / 2
+    low = max(0, int(math.floor(count / 2 - offset)))
+    high = min(count - 1, int(math.ceil(count / 2 + offset)))
+    return median, samples[low], samples[high]
+
+
+def timeCase(case, args):
+    """Warms up the case and then returns how long each call took"""
+    for _ in range(case.warmup):
+        case.function(*args)
+
+    # The garbage collector can kick in at any time and make a single timing much slower
+    # So like the timeit module, we turn it off while we're timing
+    gc.collect()
+    gcEnabled = gc.isenabled()
+    gc.disable()
+    samples = []
+    try:
+        for _ in range(case.repeat):
+            start = perfCounter()
+            for _ in range(case.number):
+                case.function(*args)
+            samples.append((perfCounter() - start) / case.number)
+    finally:
+        if gcEnabled:
+            gc.enable()
+    return samples
+
+
+def peakMemory(case, args):
+    """Calls the case once more and returns the most memory it allocated at once in bytes, or None if we can't tell"""
+    if tracemalloc is None:
+        return None
+
+    # Tracing every allocation slows the case down a lot, so we do it in a call of its own rather than while timing
+    tracemalloc.start()
+    try:
+        case.function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def runCase(case):
+    """Runs a single case and returns its results as a dictionary"""
+    args = (case.setup(),) if case.setup else ()
+    try:
+        samples = timeCase(case, args)
+        peak = peakMemory(case, args)
+    finally:
+        if case.teardown:
+            case.teardown(*args)
+
+    median, low, high = medianInterval(samples)
+    mean = sum(samples) / len(samples)
+    variance = sum((sample - mean) ** 2 for sample in samples) / max(1, len(samples) - 1)
+    return {
+        'median': median,
+        'low': low,
+        'high': high,
+        'mean': mean,
+        'stdev': math.sqrt(variance),
+        'min': min(samples),
+        'max': max(samples),
+        'samples': len(samples),
+        'itemsPerSecond': case.items / median if case.items and median else None,
+        'peakMemory': peak,
+        'processPeakMemory': processPeakMemory(),
+    }
+
+
+def run(names=None):
+    """
+    Runs the registered cases and returns the results
+
+    :param names: The names of the cases to run. If not given, every case is run
+    """
+    results = OrderedDict()
+    for name, case in cases.items():
+        if names and name not in names:
+            continue
+        result = results[name] = runCase(case)
+        line = '%-45s median %10.3fms  (95%% CI %.3f - %.3fms)' % (
+            name, result['median'] * 1000, result['low'] * 1000, result['high'] * 1000
+        )
+        if result['itemsPerSecond']:
+            line += '  %12.0f/s' % result['itemsPerSecond']
+        if result['peakMemory'] is not None:
+            line += '  peak %.1fMB' % (result['peakMemory'] / 1e6)
+        print(line)
+    return results
+
+
+def metadata():
+    """Returns information about where the benchmarks ran, so results from different machines aren't mixed up"""
+    meta = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    try:
+        from maya import cmds
+        meta['maya'] = cmds.about(version=True)
+    except Exception:
+        pass
+    return meta
+
+
+def compare(results, baseline, threshold=kDefaultThreshold):
+    """
+    Compares results against a baseline
+
+    :return: A list of (name, ratio) for every case whose median is more than threshold slower than the baseline
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not base['median']:
+            continue
+        ratio = result['median'] / base['median']
+        # We only count it if it's slower by more than the threshold,
+        # and the fastest it could be is still slower than the slowest the baseline could be
+        if ratio > 1 + threshold and result['low'] > base['high']:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Run the registered benchmarks')
+    parser.add_argument('cases', nargs='*', help='The cases to run. Runs everything if none are given')
+    parser.add_argument('--output', help='A path to write the results to as JSON')
+    parser.add_argument('--baseline', help='A JSON file of earlier results to compare against')
+    parser.add_argument('--threshold', type=float, default=kDefaultThreshold,
+                        help='How much slower than the baseline a case can be, as a fraction')
+    args = parser.parse_args(args)
+
+    # If we're not inside Maya we need to start it up before the cases can use it
+    try:
+        from maya import cmds
+        cmds.about(version=True)
+    except (ImportError, AttributeError):
+        try:
+            import maya.standalone
+            maya.standalone.initialize()
+        except ImportError:
+            # Some cases, like the push deformer kernels, don't need Maya, so we can still run those
+            print('Maya is not available, so only the cases that do not need it will run')
+
+    for module in kCaseModules:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print('Skipping the cases in %s: %s' % (module, e))
+
+    results = run(args.cases)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': metadata(), 'cases': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['cases']
+        regressions = compare(results, baseline, args.threshold)
+        for name, ratio in regressions:
+            print('REGRESSION: %s is %.1f%% slower than the baseline' % (name, (ratio - 1) * 100))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    # When run with -m this file is the __main__ module, but the case modules register with Intro.benchmark
+    # Those are two different copies of this module, so we run the one the cases were registered with
+    from Intro import benchmark
+    sys.exit(benchmark.main())
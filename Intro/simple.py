@@ -18,3 +18,12 @@ om.MGlobal.displayInfo("Hello, World! I am writing this using the OpenMaya API")
 # We can also do the same using the old API
 # For the most part they are structured the same to us, the users, but internally are quite different.
 om1.MGlobal.displayInfo("Hello, World! This is using the old API")
+
+# When we're writing lots of messages, like one for every node in the scene, calling displayInfo each time is slow
+# Instead we can use Python's logging module with a handler that writes to Maya in batches
+# Repeated messages are only written once, with a count of how many times they happened
+from Utilities import mayaLogging
+
+logger = mayaLogging.getLogger('simple')
+for i in range(1000):
+    logger.info("Hello, World! I am writing this using a logger")
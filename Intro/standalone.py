@@ -1,34 +1,35 @@
 # The Python API can be used outside of plugins as well inside of standalone scripts
 # This is a unique feature to Python and it lets us use the API without having to make a plugin for everything
+from __future__ import print_function
+
 from maya.api import OpenMaya as om
 from maya.api import OpenMayaAnim as oma
 from maya import cmds
 
-import time
+import timeit
+
+from Intro import benchmark
+from Utilities import keyframeArrays
 
 
 # Download animation from http://www.autodesk.com/maya-creativemarket-samples
 
+# Registering these with our benchmark runner lets us time them properly, with a warm up and statistics
+# They're the first cases the runner knows about
+@benchmark.register('keyframes.commands')
 def commands():
     """This function will use the Maya commands API to query keyframes in a scene"""
-    # Get the start time so we can calculate how long this took
-    start = time.time()
-
     # Ask Maya to fetch all the animCurves for the joints
     curves = cmds.ls(type='animCurveTA')
     # Then query all the keyframes
-    keyframes = set(cmds.keyframe(curves, q=True))
-
-    # Finally calculate how long those two lines took
-    delta = time.time() - start
-    # And then return it so we tally it up
-    return delta
+    # If there aren't any curves, keyframe would query the selection instead, so we don't call it
+    keyframes = set(cmds.keyframe(curves, q=True) or []) if curves else set()
+    return keyframes
 
 
+@benchmark.register('keyframes.api')
 def api():
     """This function instead uses the OpenMaya api to query the keyframes"""
-    # Get the start time
-    start = time.time()
     # Get an iterator with all the anim curves in the scene
     # The argument provided is the type to search for
     it = om.MItDependencyNodes(om.MFn.kAnimCurveTimeToAngular)
@@ -53,19 +54,34 @@ def api():
         # Finally go on to the next item in the iterator
         it.next()
 
-    # Calculate how long this took and then return it
-    delta = time.time() - start
-    return delta
+    return keyframes
+
 
+@benchmark.register('keyframes.arrays')
+def arrays():
+    """This reads the keys of every curve at once into arrays, see Utilities/keyframeArrays.py"""
+    return keyframeArrays.extract(('animCurveTA',), tangents=False).uniqueTimes
 
-# Run our code in a loop so we can calculate the time it took
-# It's important to run it multiple times because many factors can affect the speed of how a function runs
-cmdTotal = 0
-apiTotal = 0
-for x in range(1000):
-    apiTotal += api()
-    cmdTotal += commands()
 
-# On my machine, the API version takes almost half the time to run compared to the commands version
-print "Commands took: %ss and API took %ss" % (cmdTotal, apiTotal)
-print "Commands took %s times longer" % (cmdTotal / apiTotal)
+def timed(function):
+    """Runs the function and returns how long it took"""
+    # Get the start time so we can calculate how long this took
+    start = timeit.default_timer()
+    function()
+    # Finally calculate how long it took
+    return timeit.default_timer() - start
+
+
+if __name__ == '__main__':
+    # Run our code in a loop so we can calculate the time it took
+    # It's important to run it multiple times because many factors can affect the speed of how a function runs
+    # For a more reliable comparison, use the benchmark runner instead: mayapy -m Intro.benchmark
+    cmdTotal = 0
+    apiTotal = 0
+    for x in range(1000):
+        apiTotal += timed(api)
+        cmdTotal += timed(commands)
+
+    # On my machine, the API version takes almost half the time to run compared to the commands version
+    print("Commands took: %ss and API took %ss" % (cmdTotal, apiTotal))
+    print("Commands took %s times longer" % (cmdTotal / apiTotal))
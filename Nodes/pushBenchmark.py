@@ -0,0 +1,149 @@
+# This benchmark measures how fast the push deformer kernels are on synthetic meshes
+# It doesn't need Maya at all. Instead it builds stand-in arrays that behave like Maya's arrays,
+# so it can run on any machine.
+#
+# Every phase of a deform is registered with the benchmark runner in Intro/benchmark.py as its own case,
+# along with the whole deform, once for each mesh size, deform path and kind of weights.
+# For example 'push.numpy.random.100000.displacement' or 'push.python.sparse.1000000.total'.
+# The runner reports the vertices per second and peak memory of each of them.
+# To run them from the root of the project:
+#   python -m Intro.benchmark --output push.json
+from __future__ import division, print_function
+
+import random
+from array import array
+from collections import namedtuple
+
+from Intro import benchmark
+from Nodes import pushKernels
+
+# The default mesh sizes we benchmark, from a small prop up to a dense scan
+kDefaultSizes = (1000, 10000, 100000, 1000000, 2000000)
+
+# Meshes bigger than this take seconds per deform, so we time fewer of them
+kLargeSize = 100000
+
+# The phases of a deform, in the order they run
+kPhases = ('normalFetch', 'weightFetch', 'pointFetch', 'displacement', 'writeBack')
+
+# The fraction of vertices that get a weight in the sparse weights mode
+kSparseFraction = 0.05
+
+# How far each point is pushed along its normal
+kScale = 0.5
+
+# Items of our stand-in arrays, just like MPoint or MFloatVector they have x, y and z
+Vector = namedtuple('Vector', 'x y z')
+
+
+class StandInArray(object):
+    """A stand-in for MPointArray or MFloatVectorArray that stores its values in flat arrays"""
+
+    def __init__(self, count):
+        self.xs = array('d', [0.0]) * count
+        self.ys = array('d', [0.0]) * count
+        self.zs = array('d', [0.0]) * count
+
+    def length(self):
+        return len(self.xs)
+
+    def __getitem__(self, index):
+        # Maya's arrays create a new wrapper every time we index them, so we do the same
+        return Vector(self.xs[index], self.ys[index], self.zs[index])
+
+    def set(self, index, x, y, z):
+        self.xs[index] = x
+        self.ys[index] = y
+        self.zs[index] = z
+
+
+class SyntheticMesh(object):
+    """A stand-in mesh with points on a noisy sphere, unit normals and painted weights"""
+
+    def __init__(self, count, weightMode, seed=0):
+        self.count = count
+        self.weightMode = weightMode
+        rand = random.Random(seed)
+
+        self.points = StandInArray(count)
+        self.normals = StandInArray(count)
+        for i in range(count):
+            # Pick a random direction and normalize it to get the normal
+            x, y, z = rand.gauss(0, 1), rand.gauss(0, 1), rand.gauss(0, 1)
+            length = (x * x + y * y + z * z) ** 0.5 or 1.0
+            x, y, z = x / length, y / length, z / length
+            self.normals.set(i, x, y, z)
+            # Then put the point on a sphere with a little noise
+            radius = 10.0 + rand.uniform(-0.1, 0.1)
+            self.points.set(i, x * radius, y * radius, z * radius)
+
+        # Random weights paint every vertex, sparse weights only paint a few and leave the rest at zero
+        if weightMode == 'random':
+            self.weights = dict((i, rand.random()) for i in range(count))
+        else:
+            self.weights = dict(
+                (i, rand.random() if rand.random() < kSparseFraction else 0.0) for i in range(count)
+            )
+
+
+# Building a mesh and fetching its arrays is slow, so it's done once and shared by every case that uses it
+# The cases for a mesh run one after another, so we only keep the last one rather than holding on to millions of points
+prepared = {}
+
+# Everything one deform needs, fetched up front so each phase can be timed on its own
+Deform = namedtuple('Deform', 'mesh path normals weights points pushed output')
+
+
+def prepare(count, weightMode, path):
+    """Runs one deform of a synthetic mesh and keeps what each phase needs"""
+    key = (count, weightMode, path)
+    if key in prepared:
+        return prepared[key]
+
+    mesh = next((d.mesh for d in prepared.values() if (d.mesh.count, d.mesh.weightMode) == (count, weightMode)), None)
+    prepared.clear()
+    mesh = mesh or SyntheticMesh(count, weightMode)
+
+    normals = pushKernels.vectorsToArray(mesh.normals, path)
+    weights = pushKernels.weightsToArray(mesh.count, mesh.weights, path)
+    points = pushKernels.vectorsToArray(mesh.points, path)
+    pushed = pushKernels.pushPoints(points, normals, weights, kScale, path)
+    prepared[key] = Deform(mesh, path, normals, weights, points, pushed, StandInArray(count))
+    return prepared[key]
+
+
+# What each phase does, given what prepare gave back
+kPhaseFunctions = {
+    'normalFetch': lambda d: pushKernels.vectorsToArray(d.mesh.normals, d.path),
+    'weightFetch': lambda d: pushKernels.weightsToArray(d.mesh.count, d.mesh.weights, d.path),
+    'pointFetch': lambda d: pushKernels.vectorsToArray(d.mesh.points, d.path),
+    'displacement': lambda d: pushKernels.pushPoints(d.points, d.normals, d.weights, kScale, d.path),
+    'writeBack': lambda d: pushKernels.writePoints(d.pushed, d.output, d.path),
+}
+
+
+def deform(d):
+    """Runs every phase of the deform one after the other, like the deformer does"""
+    normals = pushKernels.vectorsToArray(d.mesh.normals, d.path)
+    weights = pushKernels.weightsToArray(d.mesh.count, d.mesh.weights, d.path)
+    points = pushKernels.vectorsToArray(d.mesh.points, d.path)
+    pushed = pushKernels.pushPoints(points, normals, weights, kScale, d.path)
+    pushKernels.writePoints(pushed, d.output, d.path)
+
+
+def registerCases(sizes=kDefaultSizes, weightModes=('random', 'sparse'), paths=None):
+    """Registers a case for every phase of every deform path, and one for the whole deform, for each mesh size"""
+    for count in sizes:
+        # Each call handles a whole mesh, so we don't need as many of them as the defaults
+        repeat = 3 if count > kLargeSize else 10
+        for weightMode in weightModes:
+            for path in paths or pushKernels.availablePaths():
+                # Binding these as default arguments gives each case its own values rather than the last ones in the loop
+                setup = lambda count=count, weightMode=weightMode, path=path: prepare(count, weightMode, path)
+                functions = [(phase, kPhaseFunctions[phase]) for phase in kPhases] + [('total', deform)]
+                for phase, function in functions:
+                    name = 'push.%s.%s.%d.%s' % (path, weightMode, count, phase)
+                    benchmark.register(name, setup=setup, warmup=1, repeat=repeat, items=count)(function)
+
+
+registerCases()
@@ -5,19 +5,37 @@ from maya import OpenMaya as om
 from maya import OpenMayaMPx as ompx
 import maya.cmds as cmds
 
+from Nodes import pushKernels
+
 # Unfortunately the API has changed somewhat between Maya 2015 and 2016 so we need to get the right attributes instead
-# This isn't a big deal, and if you're only using Maya 2016 or above you can skip half of this if statement
-kApiVersion = cmds.about(apiVersion=True)
-if kApiVersion < 201600:
-    inputAttr = ompx.cvar.MPxDeformerNode_input
-    inputGeomAttr = ompx.cvar.MPxDeformerNode_inputGeom
-    outputGeomAttr = ompx.cvar.MPxDeformerNode_outputGeom
-    envelopeAttr = ompx.cvar.MPxDeformerNode_envelope
-else:
-    inputAttr = ompx.cvar.MPxGeometryFilter_input
-    inputGeomAttr = ompx.cvar.MPxGeometryFilter_inputGeom
-    outputGeomAttr = ompx.cvar.MPxGeometryFilter_outputGeom
-    envelopeAttr = ompx.cvar.MPxGeometryFilter_envelope
+# We only find out which version we're in when the plugin is loaded, so that importing this module stays cheap
+# and doesn't need Maya to be running. findAttributes fills these in.
+inputAttr = None
+inputGeomAttr = None
+outputGeomAttr = None
+envelopeAttr = None
+
+
+def findAttributes():
+    """Gets the deformer attributes for the version of Maya we're running in"""
+    global inputAttr, inputGeomAttr, outputGeomAttr, envelopeAttr
+
+    # This isn't a big deal, and if you're only using Maya 2016 or above you can skip half of this if statement
+    if om.MGlobal.apiVersion() < 201600:
+        inputAttr = ompx.cvar.MPxDeformerNode_input
+        inputGeomAttr = ompx.cvar.MPxDeformerNode_inputGeom
+        outputGeomAttr = ompx.cvar.MPxDeformerNode_outputGeom
+        envelopeAttr = ompx.cvar.MPxDeformerNode_envelope
+    else:
+        inputAttr = ompx.cvar.MPxGeometryFilter_input
+        inputGeomAttr = ompx.cvar.MPxGeometryFilter_inputGeom
+        outputGeomAttr = ompx.cvar.MPxGeometryFilter_outputGeom
+        envelopeAttr = ompx.cvar.MPxGeometryFilter_envelope
+
+
+# The painted weights live on the deformer node in both versions
+weightListAttr = ompx.cvar.MPxDeformerNode_weightList
+weightsAttr = ompx.cvar.MPxDeformerNode_weights
 
 
 class PushDeformer(ompx.MPxDeformerNode):
@@ -27,6 +45,14 @@ class PushDeformer(ompx.MPxDeformerNode):
     # Now add the attributes we'll be using
     # Unlike OpenMaya 2, we need to use an empty MObject here instead of just None
     push = om.MObject()
+    smoothIterations = om.MObject()
+
+    # Building the adjacency of a mesh is expensive, so all push deformers share a cache keyed by topology
+    adjacencyCache = pushKernels.AdjacencyCache()
+
+    def __init__(self):
+        super(PushDeformer, self).__init__()
+        self.__warnedNoNumpy = False
 
     @classmethod
     def creator(cls):
@@ -42,8 +68,17 @@ class PushDeformer(ompx.MPxDeformerNode):
         nAttr.setStorable(True)
         nAttr.setChannelBox(True)
 
+        # How many times to smooth the normals before pushing along them
+        # Smoothed normals give much cleaner results on noisy meshes like scans
+        PushDeformer.smoothIterations = nAttr.create('smoothIterations', 'si', om.MFnNumericData.kInt, 0)
+        nAttr.setMin(0)
+        nAttr.setKeyable(True)
+        nAttr.setStorable(True)
+
         PushDeformer.addAttribute(PushDeformer.push)
+        PushDeformer.addAttribute(PushDeformer.smoothIterations)
         PushDeformer.attributeAffects(PushDeformer.push, outputGeomAttr)
+        PushDeformer.attributeAffects(PushDeformer.smoothIterations, outputGeomAttr)
 
         # We also want to make our node paintable
         cmds.makePaintable(
@@ -63,6 +98,11 @@ class PushDeformer(ompx.MPxDeformerNode):
         envelopeHandle = data.inputValue(envelopeAttr)
         envelope = envelopeHandle.asFloat()
 
+        # If the push or envelope is zero then nothing will move, so we can skip all the work
+        scale = push * envelope
+        if not scale:
+            return
+
         # Get the input geometry
         mesh = self.getInputMesh(data, geometryIndex)
 
@@ -78,6 +118,24 @@ class PushDeformer(ompx.MPxDeformerNode):
             om.MSpace.kTransform # Finally we tell it what space we want the normals in, in this case the local object space
         )
 
+        # We also need to know if we should smooth the normals
+        smoothIterations = data.inputValue(self.smoothIterations).asInt()
+
+        # The old API can only hand us its arrays one item at a time, so converting them to NumPy and back
+        # costs more than the math it saves. Nodes/pushBenchmark.py shows the bulk path is no faster than
+        # iterating, so we only use it when we need NumPy to smooth the normals.
+        if not smoothIterations:
+            self.deformIterator(data, geoIterator, geometryIndex, normals, scale)
+        elif pushKernels.numpy is None:
+            # We only warn once so we don't flood the script editor every time the deformer evaluates
+            if not self.__warnedNoNumpy:
+                om.MGlobal.displayWarning('%s: Smoothing normals requires NumPy' % self.name)
+                self.__warnedNoNumpy = True
+            self.deformIterator(data, geoIterator, geometryIndex, normals, scale)
+        else:
+            self.deformBulk(data, geoIterator, geometryIndex, meshFn, normals, scale, smoothIterations)
+
+    def deformIterator(self, data, geoIterator, geometryIndex, normals, scale):
         # Now we can iterate through the geometry vertices and do our deformation
         while not geoIterator.isDone():
             # Get the index of our current point
@@ -88,7 +146,7 @@ class PushDeformer(ompx.MPxDeformerNode):
             position = geoIterator.position()
             # Then calculate the offset
             # we do this by multiplying the magnitude of the normal vector by the intensity of the push and envelope
-            offset = (normal * push * envelope)
+            offset = (normal * scale)
 
             # We then query the painted weight for this area
             weight = self.weightValue(data, geometryIndex, index)
@@ -99,7 +157,71 @@ class PushDeformer(ompx.MPxDeformerNode):
             # And always remember to go on to the next item in the list
             geoIterator.next()
 
+    def deformBulk(self, data, geoIterator, geometryIndex, meshFn, normals, scale, smoothIterations=0):
+        # Instead of going vertex by vertex, we fetch everything at once and let the kernels do the math
+        vertexCount = meshFn.numVertices()
+        normals = pushKernels.vectorsToArray(normals, pushKernels.kNumpyPath)
+        if smoothIterations:
+            indptr, indices = self.getAdjacency(meshFn, geometryIndex)
+            normals = pushKernels.smoothNormals(normals, indptr, indices, smoothIterations)
+        weights = pushKernels.weightsToArray(vertexCount, self.getWeights(data, geometryIndex), pushKernels.kNumpyPath)
 
+        # We get all the positions the iterator covers in one call
+        points = om.MPointArray()
+        geoIterator.allPositions(points)
+
+        # If the deformer only affects part of the mesh, we need to know which vertex each point is
+        indices = None
+        if points.length() != vertexCount:
+            indices = []
+            geoIterator.reset()
+            while not geoIterator.isDone():
+                indices.append(geoIterator.index())
+                geoIterator.next()
+
+        # Then we pick the fastest path for these weights, push the points and write them back
+        path = pushKernels.choosePath(weights)
+        pushed = pushKernels.pushPoints(
+            pushKernels.vectorsToArray(points, path),
+            normals,
+            weights,
+            scale,
+            path,
+            indices
+        )
+        pushKernels.writePoints(pushed, points, path)
+        geoIterator.setAllPositions(points)
+
+    def getAdjacency(self, meshFn, geometryIndex):
+        # Edits like spinning an edge reconnect the vertices without changing how many there are,
+        # so we can't tell if the topology changed from the counts alone.
+        # Instead we get the topology every time and look it up in the shared cache by its hash,
+        # which is much cheaper than building the adjacency again.
+        faceCounts = om.MIntArray()
+        faceConnects = om.MIntArray()
+        meshFn.getVertices(faceCounts, faceConnects)
+        return self.adjacencyCache.get(
+            meshFn.numVertices(),
+            pushKernels.indicesToArray(faceCounts),
+            pushKernels.indicesToArray(faceConnects)
+        )
+
+    def getWeights(self, data, geometryIndex):
+        # Rather than asking for the weight of every vertex, we read only the weights that are stored
+        # Any vertex that doesn't have a stored weight uses the default of 1.0
+        weights = {}
+        weightListHandle = data.inputArrayValue(weightListAttr)
+        try:
+            weightListHandle.jumpToElement(geometryIndex)
+        except RuntimeError:
+            # Nothing has been painted on this geometry yet
+            return weights
+
+        weightsHandle = om.MArrayDataHandle(weightListHandle.inputValue().child(weightsAttr))
+        for i in range(weightsHandle.elementCount()):
+            weightsHandle.jumpToArrayElement(i)
+            weights[weightsHandle.elementIndex()] = weightsHandle.inputValue().asFloat()
+        return weights
 
     def getInputMesh(self, data, geomIdx):
         # To get the mesh we need to check the input of the node
@@ -111,6 +233,9 @@ class PushDeformer(ompx.MPxDeformerNode):
 
 
 def initializePlugin(plugin):
+    # The attributes must be found before the node is initialized, since initialize uses them
+    findAttributes()
+
     pluginFn = ompx.MFnPlugin(plugin)
     try:
         pluginFn.registerNode(
@@ -0,0 +1,276 @@
+# The push deformer does all of its math in these kernels instead of inside the node itself
+# Because nothing in here imports Maya, we can run and benchmark them with stand-in mesh arrays
+# on any machine, even a Linux box that doesn't have Maya installed.
+#
+# The kernels only rely on the small part of the Maya array interface that they need:
+#   * length() to get the number of items
+#   * [index] to get an item with x, y and z values (MPoint, MFloatVector etc...)
+#   * set(index, x, y, z) to write a point back
+
+import hashlib
+from collections import OrderedDict
+
+# NumPy isn't shipped with every version of Maya, so we treat it as optional
+# If it isn't available we can still deform using the pure Python path
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# These are the names of the deform paths we support
+# The python path mirrors the original iterator loop of the deformer
+kPythonPath = 'python'
+# The numpy path pushes every vertex at once
+kNumpyPath = 'numpy'
+# The sparse path only pushes the vertices that have a non zero weight
+kSparsePath = 'numpySparse'
+
+# If fewer than this fraction of vertices have a weight, the sparse path is faster than the dense one
+kSparseThreshold = 0.25
+
+
+def availablePaths():
+    """Returns the deform paths that can run in the current environment"""
+    if numpy is None:
+        return [kPythonPath]
+    return [kPythonPath, kNumpyPath, kSparsePath]
+
+
+def choosePath(weights):
+    """Picks the fastest deform path for the given weights array"""
+    if numpy is None:
+        return kPythonPath
+
+    # When most of the weights are zero, we can skip most of the work
+    count = len(weights)
+    if count and numpy.count_nonzero(weights) < count * kSparseThreshold:
+        return kSparsePath
+    return kNumpyPath
+
+
+def vectorsToArray(vectors, path):
+    """
+    Converts a Maya style array of points or vectors into the array type used by the given path
+
+    :param vectors: Anything with length() and items that have x, y and z. E.g. an MFloatVectorArray
+    :param path: The deform path the array will be used with
+    :return: A list of tuples for the python path, otherwise an (n, 3) NumPy array
+    """
+    # The old API arrays can't be iterated directly, so we index into them instead
+    items = [(v.x, v.y, v.z) for v in (vectors[i] for i in range(vectors.length()))]
+    if path == kPythonPath:
+        return items
+
+    return numpy.array(items, dtype=numpy.float64).reshape(-1, 3)
+
+
+def indicesToArray(ints):
+    """Converts a Maya style array of ints, like an MIntArray, into a NumPy array"""
+    return numpy.array([ints[i] for i in range(ints.length())], dtype=numpy.int64)
+
+
+def weightsToArray(count, weights, path):
+    """
+    Converts the painted weights into a dense array with one weight per vertex
+
+    :param count: The number of vertices on the mesh
+    :param weights: A dictionary of {vertexIndex: weight}. Vertices that haven't been painted default to 1.0
+    :param path: The deform path the array will be used with
+    :return: A list for the python path, otherwise a NumPy array
+    """
+    if path == kPythonPath:
+        return [weights.get(i, 1.0) for i in range(count)]
+
+    dense = numpy.ones(count, dtype=numpy.float64)
+    if weights:
+        # We convert the keys and values in one go, then scatter them into the dense array
+        indices = numpy.fromiter(weights.keys(), dtype=numpy.int64, count=len(weights))
+        values = numpy.fromiter(weights.values(), dtype=numpy.float64, count=len(weights))
+        # Weights can be left behind for vertices that no longer exist, so ignore those
+        valid = indices < count
+        dense[indices[valid]] = values[valid]
+    return dense
+
+
+def pushPoints(points, normals, weights, scale, path, indices=None):
+    """
+    Pushes the points along their normals
+
+    :param points: The positions to push, as returned by vectorsToArray
+    :param normals: The vertex normals of the whole mesh, as returned by vectorsToArray
+    :param weights: The weights of the whole mesh, as returned by weightsToArray
+    :param scale: The push amount multiplied by the envelope
+    :param path: Which deform path to use
+    :param indices: The vertex index of each point. None means the points are the whole mesh in order
+    :return: The pushed points in the same array type as the input
+    """
+    if path == kPythonPath:
+        pushed = []
+        for i, (x, y, z) in enumerate(points):
+            index = i if indices is None else indices[i]
+            # Multiply the normal by the push, envelope and painted weight to get the offset
+            amount = weights[index] * scale
+            nx, ny, nz = normals[index]
+            pushed.append((x + nx * amount, y + ny * amount, z + nz * amount))
+        return pushed
+
+    if indices is not None:
+        indices = numpy.asarray(indices)
+        weights = weights[indices]
+
+    if path == kSparsePath:
+        # We only touch the points that actually move
+        pushed = points.copy()
+        active = numpy.flatnonzero(weights)
+        normalIndices = active if indices is None else indices[active]
+        pushed[active] += normals[normalIndices] * (weights[active] * scale)[:, None]
+        return pushed
+
+    if indices is not None:
+        normals = normals[indices]
+    return points + normals * (weights * scale)[:, None]
+
+
+def writePoints(pushed, pointArray, path):
+    """Writes the pushed points back into a Maya style point array that already has the right length"""
+    if path != kPythonPath:
+        # Converting to a list first is much faster than reading the NumPy array one item at a time
+        pushed = pushed.tolist()
+
+    for i, (x, y, z) in enumerate(pushed):
+        pointArray.set(i, x, y, z)
+    return pointArray
+
+
+def topologyHash(vertexCount, faceCounts, faceConnects):
+    """
+    Creates a hash that only changes when the topology of the mesh changes
+    Moving the points around won't change it, but adding, removing or reconnecting vertices will
+    """
+    digest = hashlib.sha1()
+    digest.update(str(vertexCount).encode('ascii'))
+    digest.update(numpy.ascontiguousarray(faceCounts, dtype=numpy.int64).tobytes())
+    digest.update(numpy.ascontiguousarray(faceConnects, dtype=numpy.int64).tobytes())
+    return digest.hexdigest()
+
+
+def buildAdjacency(vertexCount, faceCounts, faceConnects):
+    """
+    Builds the vertex adjacency of a mesh as a CSR (compressed sparse row) structure
+
+    The neighbours of vertex i are indices[indptr[i]:indptr[i + 1]]
+
+    :param vertexCount: The number of vertices in the mesh
+    :param faceCounts: The number of vertices in each face
+    :param faceConnects: The vertex indices of every face, one face after the other
+    :return: A tuple of (indptr, indices) NumPy arrays
+
+    Two quads that share an edge. Reconnecting them keeps the same counts but changes the neighbours:
+
+    >>> indptr, indices = buildAdjacency(6, [4, 4], [0, 1, 4, 3, 1, 2, 5, 4])
+    >>> indices[indptr[1]:indptr[2]].tolist()
+    [0, 2, 4]
+    >>> indptr, indices = buildAdjacency(6, [4, 4], [0, 1, 2, 3, 3, 2, 5, 4])
+    >>> indices[indptr[1]:indptr[2]].tolist()
+    [0, 2]
+    """
+    counts = numpy.asarray(faceCounts, dtype=numpy.int64)
+    connects = numpy.asarray(faceConnects, dtype=numpy.int64)
+
+    # Every vertex of a face is connected to the next one, and the last one wraps around to the first
+    # So we work out where each face starts and ends, and then find the next vertex for every face vertex
+    starts = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    ends = starts + numpy.repeat(counts, counts)
+    following = numpy.arange(len(connects)) + 1
+    wrapped = following == ends
+    following[wrapped] = starts[wrapped]
+
+    # Edges go both ways, so we add each one in both directions
+    rows = numpy.concatenate([connects, connects[following]])
+    columns = numpy.concatenate([connects[following], connects])
+
+    # Edges shared by two faces show up twice, so we remove duplicates
+    # Combining the row and column into one key also sorts the result by row, which is what CSR needs
+    keys = numpy.unique(rows * vertexCount + columns)
+    rows = keys // vertexCount
+    indices = keys % vertexCount
+
+    indptr = numpy.zeros(vertexCount + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(rows, minlength=vertexCount), out=indptr[1:])
+    return indptr, indices
+
+
+def smoothNormals(normals, indptr, indices, iterations):
+    """
+    Smooths the normals by averaging each one with its neighbours
+
+    :param normals: An (n, 3) NumPy array of normals
+    :param indptr: The CSR row pointers from buildAdjacency
+    :param indices: The CSR neighbour indices from buildAdjacency
+    :param iterations: How many times to average the normals. More iterations give smoother results
+    :return: An (n, 3) NumPy array of unit length normals
+    """
+    if iterations <= 0 or not len(indices):
+        return normals
+
+    # This tells us which vertex each neighbour entry belongs to
+    count = len(normals)
+    rows = numpy.repeat(numpy.arange(count), numpy.diff(indptr))
+
+    smoothed = normals
+    for _ in range(iterations):
+        # Each vertex keeps its own normal and adds on the normals of all of its neighbours
+        total = smoothed.copy()
+        for axis in range(3):
+            total[:, axis] += numpy.bincount(rows, weights=smoothed[indices, axis], minlength=count)
+
+        # Normalizing the sum gives us the same direction as the average
+        lengths = numpy.sqrt((total * total).sum(axis=1))
+        lengths[lengths == 0] = 1.0
+        smoothed = total / lengths[:, None]
+
+    return smoothed
+
+
+class AdjacencyCache(object):
+    """
+    Holds on to the adjacency of the most recently used topologies, keyed by their topology hash
+    This way we only ever build the adjacency of a mesh once, even if several deformers use it
+    """
+
+    def __init__(self, maxSize=8):
+        self.maxSize = maxSize
+        # Counters so we can check how well the cache is working
+        self.hits = 0
+        self.misses = 0
+        # The ordered dictionary remembers which entries were used most recently
+        self.__entries = OrderedDict()
+
+    def get(self, vertexCount, faceCounts, faceConnects):
+        """
+        Gets the (indptr, indices) adjacency for the topology, building it if we haven't seen it before
+
+        >>> cache = AdjacencyCache()
+        >>> first = cache.get(6, [4, 4], [0, 1, 4, 3, 1, 2, 5, 4])
+        >>> second = cache.get(6, [4, 4], [0, 1, 2, 3, 3, 2, 5, 4])
+        >>> cache.get(6, [4, 4], [0, 1, 4, 3, 1, 2, 5, 4]) is first
+        True
+        >>> cache.hits, cache.misses
+        (1, 2)
+        """
+        key = topologyHash(vertexCount, faceCounts, faceConnects)
+        adjacency = self.__entries.pop(key, None)
+        if adjacency is None:
+            self.misses += 1
+            adjacency = buildAdjacency(vertexCount, faceCounts, faceConnects)
+        else:
+            self.hits += 1
+
+        # Put it back at the end so it counts as the most recently used
+        self.__entries[key] = adjacency
+        while len(self.__entries) > self.maxSize:
+            self.__entries.popitem(last=False)
+        return adjacency
+
+    def clear(self):
+        self.__entries.clear()
@@ -46,13 +46,15 @@ class CharacterRoot(ompx.MPxTransform):
 
 def initializePlugin(plugin):
     # Add the current directory to the script path so it can find the template we wrote
-    dirName = 'E:\Projects\AdvancedPythonForMaya\Scene'
+    # The template lives next to this file, so we work out its directory rather than hardcoding it
+    dirName = os.path.dirname(os.path.abspath(__file__))
     # Maya will look for the environment vairable, MAYA_SCRIPT_PATH to look for scripts
-    MAYA_SCRIPT_PATH = os.getenv('MAYA_SCRIPT_PATH')
-    if dirName not in MAYA_SCRIPT_PATH:
+    # It might not be set at all, for example in a fresh mayapy session
+    scriptPaths = [path for path in os.getenv('MAYA_SCRIPT_PATH', '').split(os.pathsep) if path]
+    if dirName not in scriptPaths:
         # os.pathsep gives us the character that separates paths on your specific operating system
-        MAYA_SCRIPT_PATH += (os.pathsep + dirName)
-        os.environ['MAYA_SCRIPT_PATH'] = MAYA_SCRIPT_PATH
+        scriptPaths.append(dirName)
+        os.environ['MAYA_SCRIPT_PATH'] = os.pathsep.join(scriptPaths)
 
     pluginFn = ompx.MFnPlugin(plugin)
     try:
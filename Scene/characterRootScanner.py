@@ -0,0 +1,271 @@
+# Finding the characterRoot nodes in a scene by opening it in Maya is slow, especially across thousands of files.
+# Maya ASCII files are just text though, so we can read the information we need straight out of them.
+#
+# This module streams through .ma files one line at a time, only looking closely at the statements we care about.
+# It finds every `createNode characterRoot` along with the version and author set on it,
+# and stops reading as soon as it reaches the part of the file that comes after all the nodes.
+#
+# It can scan a whole directory tree using a pool of processes, and saves the results to an index file.
+# Files that haven't changed since the last scan are read from the index instead of being scanned again.
+#
+# To scan a directory from the root of the project run:
+#   python -m Scene.characterRootScanner /path/to/assets --index characterRoots.idx
+from __future__ import print_function
+
+import argparse
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import re
+
+# The node type we're looking for and the default values of its attributes
+# These must match the attributes created in characterRoot.py
+kNodeType = 'characterRoot'
+kDefaults = {'version': 0, 'author': 'Dhruv Govil'}
+# The setAttr lines can use either the long or short name of an attribute
+kAttributes = {
+    '.version': 'version', '.ver': 'version',
+    '.author': 'author', '.a': 'author',
+}
+
+# Maya writes every node in the file before any of these statements
+# So once we see one of them, there are no more nodes to find
+kEndOfNodes = frozenset(['select', 'connectAttr', 'relationship'])
+
+# These are the only statements we need to read the contents of
+kInteresting = frozenset(['createNode', 'setAttr'])
+
+# Statements longer than this can't be ones we care about, so we stop collecting them to keep memory bounded
+kMaxStatementLength = 64 * 1024
+
+# A token is either a quoted string, a semicolon or a run of anything else that isn't whitespace
+kTokenPattern = re.compile(r'"(?:[^"\\]|\\.)*"|;|[^\s;"]+')
+# The escape sequences Maya uses inside strings
+kEscapePattern = re.compile(r'\\(.)')
+kEscapes = {'n': '\n', 't': '\t', 'r': '\r'}
+
+# The version of our index file format
+kIndexVersion = 1
+
+
+def unquote(token):
+    """Turns a quoted token from the file back into the string it represents"""
+    if len(token) >= 2 and token[0] == '"' and token[-1] == '"':
+        return kEscapePattern.sub(lambda match: kEscapes.get(match.group(1), match.group(1)), token[1:-1])
+    return token
+
+
+def statementEnds(line):
+    """Returns whether the statement ends on this line, ignoring any semicolons inside strings"""
+    if '"' not in line:
+        return ';' in line
+    return any(token == ';' for token in kTokenPattern.findall(line))
+
+
+def iterStatements(lines, interesting=kInteresting):
+    """
+    Splits the lines of a Maya ASCII file into statements
+
+    :param lines: An iterable of lines, like an open file
+    :param interesting: The commands we want the tokens for
+    :return: A generator of (command, tokens) tuples. Tokens is None for commands that aren't interesting
+    """
+    command = None
+    collected = None
+    length = 0
+
+    for line in lines:
+        if command is None:
+            # This line starts a new statement, so we find out what command it is
+            stripped = line.lstrip()
+            if not stripped or stripped.startswith('//'):
+                continue
+            command = stripped.split(None, 1)[0].rstrip(';')
+            collected = [line] if command in interesting else None
+            length = len(line)
+        elif collected is not None:
+            length += len(line)
+            if length > kMaxStatementLength:
+                collected = None
+            else:
+                collected.append(line)
+
+        if statementEnds(line):
+            tokens = None
+            if collected is not None:
+                tokens = [token for token in kTokenPattern.findall(''.join(collected)) if token != ';']
+            yield command, tokens
+            command = None
+            collected = None
+
+
+def parseCreateNode(tokens):
+    """Gets the node type, name and parent out of the tokens of a createNode statement"""
+    nodeType = tokens[1] if len(tokens) > 1 else None
+    name = parent = None
+    for flag, value in zip(tokens, tokens[1:]):
+        if flag in ('-n', '-name'):
+            name = unquote(value)
+        elif flag in ('-p', '-parent'):
+            parent = unquote(value)
+    return nodeType, name, parent
+
+
+def parseSetAttr(tokens):
+    """Gets the attribute and its value out of the tokens of a setAttr statement"""
+    # The attribute is the first quoted token. Anything before it is a flag like -k on
+    for i, token in enumerate(tokens[1:], 1):
+        if not token.startswith('"'):
+            continue
+
+        attribute = unquote(token)
+        if not attribute.startswith('.'):
+            # Only attributes on the current node start with a dot
+            return None, None
+
+        # The value comes last, after any flags like -type "string"
+        remaining = tokens[i + 1:]
+        if not remaining or remaining[-1].startswith('-'):
+            return attribute, None
+        return attribute, unquote(remaining[-1])
+    return None, None
+
+
+def scanLines(lines):
+    """
+    Finds every characterRoot node in the lines of a Maya ASCII file
+
+    :return: A list of dictionaries with the name, parent, version and author of each characterRoot
+    """
+    roots = []
+    current = None
+
+    for command, tokens in iterStatements(lines):
+        if command in kEndOfNodes:
+            # Every node has been created by now so there's nothing left to find
+            break
+
+        if command == 'createNode':
+            nodeType, name, parent = parseCreateNode(tokens or [])
+            current = None
+            if nodeType == kNodeType:
+                current = dict(kDefaults, name=name, parent=parent)
+                roots.append(current)
+        elif command == 'setAttr' and current is not None and tokens:
+            attribute, value = parseSetAttr(tokens)
+            key = kAttributes.get(attribute)
+            if key == 'version':
+                try:
+                    current[key] = int(value)
+                except (TypeError, ValueError):
+                    pass
+            elif key == 'author' and value is not None:
+                current[key] = value
+
+    return roots
+
+
+def scanFile(path):
+    """Finds every characterRoot node in a Maya ASCII file"""
+    # Opening the file this way gives us the same text handling on Python 2 and 3
+    with io.open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return scanLines(f)
+
+
+def _scanWorker(path):
+    # The process pool can't send exceptions back nicely, so we send the error message instead
+    try:
+        return path, scanFile(path), None
+    except (IOError, OSError, UnicodeError) as e:
+        return path, [], str(e)
+
+
+def findScenes(directory):
+    """Walks the directory and yields the path of every Maya ASCII file in it"""
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith('.ma'):
+                yield os.path.join(root, name)
+
+
+def loadIndex(path):
+    """Loads an index file, giving back an empty index if it doesn't exist or is from another version"""
+    if not path or not os.path.exists(path):
+        return {}
+    with gzip.open(path, 'rb') as f:
+        data = json.loads(f.read().decode('utf-8'))
+    if data.get('version') != kIndexVersion:
+        return {}
+    return data['files']
+
+
+def saveIndex(path, files):
+    """Saves the index as compact, gzipped JSON"""
+    data = json.dumps({'version': kIndexVersion, 'files': files}, separators=(',', ':'), sort_keys=True)
+    with gzip.open(path, 'wb') as f:
+        f.write(data.encode('utf-8'))
+
+
+def scanTree(directory, indexPath=None, processes=None):
+    """
+    Finds every characterRoot in every Maya ASCII file under the directory
+
+    :param directory: The directory to search
+    :param indexPath: An optional index file. Unchanged files are read from it and the results are saved to it
+    :param processes: How many processes to scan with. Defaults to the number of CPUs
+    :return: A dictionary of {path: [characterRoot, ...]}
+    """
+    index = loadIndex(indexPath)
+    files = {}
+    toScan = []
+
+    for path in findScenes(directory):
+        stat = os.stat(path)
+        entry = index.get(path)
+        # If the file hasn't changed since it was indexed, we can use what we found last time
+        if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+            files[path] = entry
+        else:
+            files[path] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'roots': []}
+            toScan.append(path)
+
+    if toScan:
+        pool = multiprocessing.Pool(processes)
+        try:
+            # Small files finish quickly, so we send them out in chunks to keep the overhead down
+            chunksize = max(1, len(toScan) // ((processes or multiprocessing.cpu_count()) * 8))
+            for path, roots, error in pool.imap_unordered(_scanWorker, toScan, chunksize):
+                if error:
+                    print('Failed to scan %s: %s' % (path, error))
+                    # We don't save files that failed, so they're scanned again next time
+                    files.pop(path)
+                    continue
+                files[path]['roots'] = roots
+        finally:
+            pool.close()
+            pool.join()
+
+    if indexPath:
+        saveIndex(indexPath, files)
+
+    return dict((path, entry['roots']) for path, entry in files.items())
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Find the characterRoot nodes in Maya ASCII files')
+    parser.add_argument('directory', help='The directory to search for .ma files')
+    parser.add_argument('--index', help='The index file to read and update')
+    parser.add_argument('--processes', type=int, help='How many processes to use')
+    args = parser.parse_args(args)
+
+    results = scanTree(args.directory, args.index, args.processes)
+    for path in sorted(results):
+        for root in results[path]:
+            print('%s\t%s\tversion=%s\tauthor=%s' % (path, root['name'], root['version'], root['author']))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,16 @@
 # At long last we can go back to using the API v2.0
 
-import sys
+import ctypes
+import itertools
 import maya.api.OpenMaya as om
 import maya.api.OpenMayaUI as omui
-import maya.api.OpenMayaAnim as oma
 import maya.api.OpenMayaRender as omr
+import maya.cmds as cmds
 import os
+import weakref
+
+from Scene import shapeLibrary
+from Utilities.callbackManager import SceneCallbackManager
 
 
 # Because we're using the OpenMaya 2 API we need to define this function again to let Maya know
@@ -29,8 +34,53 @@ shapes = {
     ]
 }
 
-# We'll sort and store the list of names in an easy to access list
-shapeNames = sorted(shapes.keys())
+# A studio can have far more shapes than we'd want to write out here
+# So if this environment variable points to a shape library file, we load our shapes from there instead
+kShapeLibraryEnvVar = 'CUSTOM_LOCATOR_SHAPE_LIBRARY'
+
+# The library gives us the names of the shapes and loads their points the first time they're needed
+library = shapeLibrary.MemoryShapeLibrary(shapes)
+
+# We'll store the list of names in an easy to access list
+# The library keeps them sorted so we don't need to sort them ourselves
+shapeNames = library.names
+
+# This will hold the geometry for each shape, keyed by the index of the shape in shapeNames
+# Each one is built the first time it's drawn and then shared by every locator
+shapeGeometry = {}
+
+# We can draw our locators in one of two ways, and pick which one when the plugin loads
+# The draw override draws every locator on its own, which is simple and good for a few locators
+kDrawOverrideMode = 'drawOverride'
+# The subscene override gives Maya render items and GPU buffers that it can keep around between frames
+# This is better when we have thousands of locators
+kSubSceneMode = 'subScene'
+# Set this environment variable to one of the modes above before loading the plugin to choose between them
+kDrawModeEnvVar = 'CUSTOM_LOCATOR_DRAW_MODE'
+# The mode the plugin was loaded with
+drawMode = kDrawOverrideMode
+
+# When locators only cover a few pixels on screen, there's no point drawing every line and triangle
+# So we draw them with one of these levels of detail depending on how big they are on screen
+kFullLod = 'full'  # Every line and triangle of the shape
+kSimplifiedLod = 'simplified'  # Just a simplified outline of the shape
+kPointLod = 'point'  # A single point
+
+# These are the sizes in pixels where we switch between the levels of detail
+# Locators at least fullSize pixels across are drawn fully, and ones smaller than pointSize are drawn as a point
+# Picking a level means Maya has to ask every locator to draw again on every frame, even when only the camera moves.
+# That's a lot of Python for a big scene, so they're off by default. Use setLodThresholds to turn them on
+lodThresholds = {
+    'fullSize': 0.0,
+    'pointSize': 0.0,
+}
+# Sizes that work well for most scenes, for setLodThresholds(**kDefaultLodThresholds)
+kDefaultLodThresholds = {
+    'fullSize': 32.0,
+    'pointSize': 6.0,
+}
+# How many pixels across the point is when we draw a locator as a point
+kLodPointSize = 4.0
 
 
 class CustomLocator(omui.MPxLocatorNode):
@@ -45,10 +95,41 @@ class CustomLocator(omui.MPxLocatorNode):
     shape = None
     color = None
 
+    # When our locators are bounded, Maya can skip drawing the ones that are outside of the view
+    # This is only here so we can turn it off to compare the difference
+    bounded = True
+
     @classmethod
     def creator(cls):
         return cls()
 
+    def postConstructor(self):
+        # Make sure the new locator is drawn the first time around
+        tracker.markDirty(self.thisMObject())
+
+    def setDependentsDirty(self, plug, plugArray):
+        # Maya calls this whenever one of our plugs is dirtied, including when it's set
+        # So we find out about changes to the shape or color from the node itself, without any callbacks
+        # For the color, the plug may be one of its children
+        attribute = plug.parent().attribute() if plug.isChild else plug.attribute()
+        if attribute == CustomLocator.shape or attribute == CustomLocator.color:
+            tracker.markDirty(self.thisMObject())
+        elif attribute in (CustomLocator.worldMatrix, CustomLocator.parentMatrix, CustomLocator.visibility):
+            # The subscene override draws every locator at once, so it needs to know when any of them move
+            tracker.markMoved()
+        return super(CustomLocator, self).setDependentsDirty(plug, plugArray)
+
+    def isBounded(self):
+        return CustomLocator.bounded
+
+    def boundingBox(self):
+        # The bounding box is the box of the shape we're drawing
+        # Maya takes care of moving and scaling it with our transform
+        geometry = getShapeGeometry(om.MPlug(self.thisMObject(), CustomLocator.shape).asInt())
+        if geometry is None:
+            return om.MBoundingBox()
+        return om.MBoundingBox(geometry.bounds)
+
     @staticmethod
     def initialize():
         eAttr = om.MFnEnumAttribute()
@@ -82,9 +163,16 @@ class CustomLocatorDrawOverride(omr.MPxDrawOverride):
             # The callback to invoke when drawing
             None,
             # isAlwaysDirty. If set to true, it can be much heavier because it constantly updates
-            False
+            # Maya only asks for new drawables when the locator itself changes, but the level of detail changes
+            # whenever the camera moves. So while it's on, we need to be asked every frame.
+            # That's why the levels of detail are off by default
+            isLodActive()
         )
 
+        # We remember the bounding box of the locator, and which generation of the locator it was for
+        self.__bounds = om.MBoundingBox()
+        self.__boundsGeneration = None
+
     @classmethod
     def creator(cls, obj):
         # The override gets a reference to the object being drawn
@@ -95,6 +183,19 @@ class CustomLocatorDrawOverride(omr.MPxDrawOverride):
         # Tell Maya which viewports we can render in.
         return omr.MRenderer.kOpenGL | omr.MRenderer.kDirectX11 | omr.MRenderer.kOpenGLCoreProfile
 
+    def isBounded(self, objPath, cameraPath):
+        # If we tell Maya how big our locator is, it won't ask us to draw locators that are out of view
+        return CustomLocator.bounded
+
+    def boundingBox(self, objPath, cameraPath):
+        # This gets called a lot, so we only look up the shape again if the locator has changed
+        generation = tracker.generation(objPath.node())
+        if generation != self.__boundsGeneration:
+            geometry = getShapeGeometry(om.MPlug(objPath.node(), CustomLocator.shape).asInt())
+            self.__bounds = om.MBoundingBox(geometry.bounds) if geometry else om.MBoundingBox()
+            self.__boundsGeneration = generation
+        return self.__bounds
+
     def prepareForDraw(self, objPath, cameraPath, frameContext, oldData):
         """
         Maya calls this function whenever the object needs to be updated for a draw.
@@ -116,6 +217,15 @@ class CustomLocatorDrawOverride(omr.MPxDrawOverride):
         # We need to find out which shape we're expected to draw
         # We can get this from the objPath
         locator = objPath.node()
+
+        # If nothing about this locator has changed since we last built its data, we can just reuse it
+        # This saves us reading any plugs at all
+        generation = tracker.generation(locator)
+        if data.generation == generation:
+            tracker.skipped += 1
+            return data
+        tracker.refreshed += 1
+
         # From this we get the plug and see what the value is set to
         shapePlug = om.MPlug(locator, CustomLocator.shape)
 
@@ -130,21 +240,8 @@ class CustomLocatorDrawOverride(omr.MPxDrawOverride):
         # The ampersand operator checks if the two bit values are equal
         # It's an efficient way to compare two states even if they are integers
         if state & omr.MGeometryUtilities.kDormant:
-            # We get the color plug and try and get its value
-            colorPlug = om.MPlug(locator, CustomLocator.color)
-            if colorPlug.isNull:
-                # If it can't be fetched then default it
-                color = om.MColor((0.5, 0.3, 0.3))
-            else:
-                # If it is available, then lets get the color
-                color = []
-                # The color is a compound attribute so we need to get all the children
-                # We do this by looping through it
-                for channel in range(colorPlug.numChildren()):
-                    channelPlug = colorPlug.child(channel)
-                    color.append(channelPlug.asFloat())
-                color = om.MColor(color)
-
+            # We get the color the user has set on the node
+            color = getLocatorColor(locator)
             # Set the color that we'll be drawing now so it always gets updated
             # data.color = omr.MGeometryUtilities.wireframeColor(objPath)
             data.color = color
@@ -152,55 +249,12 @@ class CustomLocatorDrawOverride(omr.MPxDrawOverride):
             # Otherwise if it is any form of selected, just shade it by the wireframe color
             data.color = omr.MGeometryUtilities.wireframeColor(objPath)
 
-        # Then lets see what index is set for the shape
-        shape = shapePlug.asInt()
-        # If it matches the current shape, then just return the data
-        if shape == data.shape:
-            return data
-
-        # If it's a different shape then before, lets calculate its properties
-        shapeName = shapeNames[shape]
-        currentShapePoints = shapes[shapeName]
-        currentShapePointCount = len(currentShapePoints)
-
-        # We'll clear the existing data
-        data.lineList.clear()
-        data.triangleList.clear()
-
-        # Then lets construct some new data to draw
-        for i in range(currentShapePointCount - 1):
-            # We start out by  defining the lines of this shape
-            # These consist of two points, each with an xyz
-            data.lineList.append(om.MPoint(
-                currentShapePoints[i][0],
-                currentShapePoints[i][1],
-                currentShapePoints[i][2]
-            ))
-            data.lineList.append(om.MPoint(
-                currentShapePoints[i + 1][0],
-                currentShapePoints[i + 1][1],
-                currentShapePoints[i + 1][2]
-            ))
-
-            # Then lets construct the triangles that will fill out this shape.
-            data.triangleList.append(om.MPoint(
-                currentShapePoints[0][0],
-                currentShapePoints[0][1],
-                currentShapePoints[0][2]
-            ))
-
-            data.triangleList.append(om.MPoint(
-                currentShapePoints[i][0],
-                currentShapePoints[i][1],
-                currentShapePoints[i][2]
-            ))
-
-            data.triangleList.append(om.MPoint(
-                currentShapePoints[i + 1][0],
-                currentShapePoints[i + 1][1],
-                currentShapePoints[i + 1][2]
-            ))
+        # Finally we store which shape to draw
+        # The geometry itself is shared by every locator so we don't need to build anything here
+        data.shape = shapePlug.asInt()
 
+        # Remember which generation of the locator this data was built for
+        data.generation = generation
         return data
 
     def hasUIDrawables(self):
@@ -212,6 +266,15 @@ class CustomLocatorDrawOverride(omr.MPxDrawOverride):
         if not isinstance(data, LocatorData):
             return
 
+        # Then we look up the shared geometry for the shape, and skip drawing if it doesn't exist
+        geometry = getShapeGeometry(data.shape)
+        if geometry is None:
+            return
+
+        # Work out how much detail we should draw the locator with, based on how big it is on screen
+        lod = chooseLod(geometry, objPath, frameContext) if isLodActive() else kFullLod
+        tracker.drawn[lod] += 1
+
         # Start drawing
         drawManager.beginDrawable()
 
@@ -228,44 +291,591 @@ class CustomLocatorDrawOverride(omr.MPxDrawOverride):
             depthPriority = omr.MRenderItem.sDormantFilledDepthPriority
         drawManager.setDepthPriority(depthPriority)
 
-        # Set the drawing mode based on the current shading type
-        if (frameContext.getDisplayStyle() & omr.MFrameContext.kGouraudShaded):
-            drawManager.mesh(
-                omr.MGeometry.kTriangles,
-                data.triangleList
-            )
+        if lod == kPointLod:
+            # If it's tiny, a single point is all anyone will see
+            drawManager.setPointSize(kLodPointSize)
+            drawManager.point(geometry.bounds.center)
+        elif lod == kSimplifiedLod:
+            # If it's small, we only draw the simplified outline
+            drawManager.mesh(omr.MUIDrawManager.kLines, geometry.simplifiedLineList)
+        else:
+            # Set the drawing mode based on the current shading type
+            if (frameContext.getDisplayStyle() & omr.MFrameContext.kGouraudShaded):
+                drawManager.mesh(
+                    omr.MGeometry.kTriangles,
+                    geometry.triangleList
+                )
 
-        # Give it the lines to draw
-        drawManager.mesh(omr.MUIDrawManager.kLines, data.lineList)
+            # Give it the lines to draw
+            drawManager.mesh(omr.MUIDrawManager.kLines, geometry.lineList)
 
         # Then end drawing
         drawManager.endDrawable()
 
 
+# This class is an alternative to the draw override above
+# Instead of drawing each locator ourselves every frame, we give Maya render items that it keeps
+# and only update them when something changes
+class CustomLocatorSubSceneOverride(omr.MPxSubSceneOverride):
+    name = 'customLocatorSubSceneOverride'
+
+    def __init__(self, obj):
+        super(CustomLocatorSubSceneOverride, self).__init__(obj)
+        # We hold on to the node so we can find its attributes and instances later
+        self.locator = obj
+        # For each render item we've made, we remember its shader and the transforms we last gave it
+        # That way we only update the render items whose instances actually changed
+        self.__items = {}
+        # The version of the tracker we last updated for
+        self.__version = None
+
+        batch.add(self)
+
+    @classmethod
+    def creator(cls, obj):
+        return cls(obj)
+
+    def supportedDrawAPIs(self):
+        return omr.MRenderer.kOpenGL | omr.MRenderer.kDirectX11 | omr.MRenderer.kOpenGLCoreProfile
+
+    def requiresUpdate(self, container, frameContext):
+        # Only one override draws the batch. The others have nothing to do, unless they have items to let go of
+        if not batch.claim(self):
+            return bool(self.__items)
+        # The tracker's version goes up whenever any locator changes, moves, is selected or is removed
+        # So if it's the same as last time, every render item is already up to date
+        return self.__version != tracker.version
+
+    def update(self, container, frameContext):
+        """
+        Maya calls this when our render items may need updating.
+        We group every visible instance of every locator by its shape, color and whether it's selected,
+        and draw each group with a single render item that uses the shared buffers for the shape
+        and a transform for each instance.
+
+        :param container: Holds the render items for this node
+        :param frameContext: Frame level context information
+        """
+        # Anything that changes while we're updating will bump the version again, and we'll update next frame
+        self.__version = tracker.version
+        groups = batch.groups() if batch.claim(self) else {}
+
+        # Make a list of the render items we want to have, and what they should look like
+        # The selection state is part of the name, since it decides the depth priority of the item
+        wanted = {}
+        for (groupShape, colorKey, active), (color, matrices) in groups.items():
+            for primitive in (omr.MGeometry.kLines, omr.MGeometry.kTriangles):
+                itemName = '%s_%s_%d_%s' % (
+                    primitive, groupShape, active, '_'.join(str(channel) for channel in colorKey)
+                )
+                wanted[itemName] = (primitive, groupShape, color, active, matrices)
+
+        # Remove any render items whose group no longer exists
+        shaderManager = omr.MRenderer.getShaderManager()
+        for itemName in list(self.__items):
+            if itemName not in wanted:
+                container.remove(itemName)
+                shaderManager.releaseShader(self.__items.pop(itemName)[0])
+
+        for itemName, (primitive, groupShape, color, active, matrices) in wanted.items():
+            item = container.find(itemName)
+            if item is None:
+                # If it's a new group, we create a render item that uses the shared buffers for the shape
+                item = omr.MRenderItem.create(itemName, omr.MRenderItem.DecorationItem, primitive)
+                if primitive == omr.MGeometry.kTriangles:
+                    # The triangles are only drawn in shaded mode, just like the draw override
+                    item.setDrawMode(omr.MGeometry.kShaded | omr.MGeometry.kTextured)
+                else:
+                    item.setDrawMode(omr.MGeometry.kAll)
+                if active:
+                    item.setDepthPriority(omr.MRenderItem.sActiveWireDepthPriority)
+                else:
+                    item.setDepthPriority(omr.MRenderItem.sDormantFilledDepthPriority)
+
+                shader = shaderManager.getStockShader(omr.MShaderManager.k3dSolidShader)
+                shader.setParameter('solidColor', [color.r, color.g, color.b, color.a])
+                item.setShader(shader)
+
+                container.add(item)
+                buffers = getShapeBuffers(groupShape)
+                vertexBuffers, indexBuffer = buffers.get(primitive)
+                self.setGeometryForRenderItem(item, vertexBuffers, indexBuffer, buffers.bounds)
+                self.__items[itemName] = (shader, None)
+
+            # Then we only update the transforms if they're different from last time
+            shader, lastMatrices = self.__items[itemName]
+            if lastMatrices is not None and len(lastMatrices) == len(matrices) and all(
+                    last.isEquivalent(matrix) for last, matrix in zip(lastMatrices, matrices)):
+                continue
+
+            self.setInstanceTransformArray(item, om.MMatrixArray(matrices))
+            self.__items[itemName] = (shader, matrices)
+
+
+class SubSceneBatch(object):
+    """
+    Every locator gets its own subscene override, but if each one made its own render items
+    we'd still have a render item for every locator.
+    Instead one of the overrides, the owner, draws the render items for every locator,
+    so there's only one render item for each shape, color and selection state in the whole scene.
+    If the owner's locator is deleted, the next override that Maya asks about takes over.
+    """
+
+    def __init__(self):
+        # Every locator that has a subscene override, keyed by the hash code of its MObjectHandle
+        self.locators = {}
+        # A weak reference to the override that draws the batch, so we don't keep it alive after Maya is done with it
+        self.__owner = None
+
+    def add(self, override):
+        handle = om.MObjectHandle(override.locator)
+        self.locators[handle.hashCode()] = handle
+        # The new locator needs to be drawn by the owner
+        tracker.markMoved()
+
+    def claim(self, override):
+        """Returns whether the override draws the batch, making it the owner if there isn't one"""
+        owner = self.__owner() if self.__owner else None
+        if owner is None or not om.MObjectHandle(owner.locator).isValid():
+            self.__owner = weakref.ref(override)
+            owner = override
+        return owner is override
+
+    def clear(self):
+        self.locators = {}
+        self.__owner = None
+
+    def groups(self):
+        """
+        Groups every visible instance of every locator by the shape, color and selection state it's drawn with
+
+        :return: A dictionary of {(shape, colorKey, active): (color, [matrix, ...])}
+        """
+        groups = {}
+        for key, handle in list(self.locators.items()):
+            if not handle.isValid():
+                # A deleted locator can come back if the delete is undone, so we only forget the ones that are gone
+                if not handle.isAlive():
+                    del self.locators[key]
+                continue
+
+            node = handle.object()
+            shape = om.MPlug(node, CustomLocator.shape).asInt()
+            if getShapeBuffers(shape) is None:
+                continue
+
+            worldMatrixPlug = om.MPlug(node, CustomLocator.worldMatrix)
+            dormantColor = None
+            for path in om.MDagPath.getAllPathsTo(node):
+                # We're drawing the instances ourselves, so it's up to us to skip the hidden ones
+                if not path.isVisible():
+                    continue
+
+                state = omr.MGeometryUtilities.displayStatus(path)
+                if state & omr.MGeometryUtilities.kDormant:
+                    # Every dormant instance shares the color of the node, so we only read it once
+                    if dormantColor is None:
+                        dormantColor = getLocatorColor(node)
+                    color = dormantColor
+                else:
+                    color = omr.MGeometryUtilities.wireframeColor(path)
+                active = 1 if state & omr.MGeometryUtilities.kActiveComponent else 0
+
+                # We read the world matrix from the plug rather than the path because that cleans the plug.
+                # A dirty plug isn't dirtied again, so otherwise we'd only hear about the first time it moved
+                matrixPlug = worldMatrixPlug.elementByLogicalIndex(path.instanceNumber())
+                matrix = om.MFnMatrixData(matrixPlug.asMObject()).matrix()
+
+                # Colors can't be used as dictionary keys, so we use their values instead
+                groupKey = (shape, tuple(round(channel, 4) for channel in color), active)
+                groups.setdefault(groupKey, (color, []))[1].append(matrix)
+        return groups
+
+
 class LocatorData(om.MUserData):
     def __init__(self):
         # The false tells it not to delete after its used
         super(LocatorData, self).__init__(False)
 
+        # Each locator only stores which shape to draw and what color to draw it in
+        # The points themselves live in the shared shapeGeometry cache
         self.shape = None  # The shape index that is being drawn
         self.color = om.MColor()  # Holds the color to draw
+        self.generation = None  # The generation of the locator this data was built for
+
+
+class LocatorTracker(object):
+    """
+    The LocatorTracker keeps track of which locators have changed since they were last drawn.
+
+    Every locator has a generation number that goes up whenever its shape or color is changed,
+    or whenever it's selected or deselected.
+    The draw data remembers the generation it was built for, so if they match there's nothing to update.
+
+    The locators bump their own generation from setDependentsDirty, so the tracker doesn't need a callback
+    for each locator. It only has one callback for the selection, and shares the callback manager's
+    node removed callback to forget locators that are deleted.
+    """
+
+    def __init__(self):
+        # The generation of each locator, keyed by the hash code of its MObjectHandle
+        self.generations = {}
+        # The hash codes of the locators that were selected last time the selection changed
+        self.__selected = set()
+
+        # The ids of the callbacks we've registered so we can remove them later
+        self.__callbackIDs = []
+        # The ids of the callbacks on each model panel, keyed by the name of the panel
+        self.__panelCallbacks = {}
+
+        # This goes up whenever any locator changes, moves or is removed
+        # The subscene override draws every locator at once, so this lets it know if it has anything to do
+        self.version = 0
+
+        # Counters for how many locators we've refreshed and skipped in the current frame
+        self.refreshed = 0
+        self.skipped = 0
+        # As well as how many we've drawn at each level of detail
+        self.drawn = dict.fromkeys((kFullLod, kSimplifiedLod, kPointLod), 0)
+        # And the counts for the last frame that finished drawing
+        self.lastFrame = {'refreshed': 0, 'skipped': 0, 'drawn': dict(self.drawn)}
+
+    def start(self):
+        """Starts listening for selection changes, removed locators and the end of each frame"""
+        self.__callbackIDs.append(
+            om.MModelMessage.addCallback(om.MModelMessage.kActiveListModified, self.selectionChanged)
+        )
+
+        # We share the callback manager's node removed callback rather than adding one for every locator
+        SceneCallbackManager.instance().registerNodeRemoved(self.locatorRemoved, nodeType=CustomLocator.name)
+
+        # When the evaluation manager plays back animation it doesn't dirty anything,
+        # so we also count every change of time as the locators moving
+        self.__callbackIDs.append(om.MDGMessage.addTimeChangeCallback(self.markMoved))
+
+        # Each viewport lets us know when it's done drawing so we can count the locators per frame
+        # There are no viewports in batch mode, so there's nothing to count
+        if om.MGlobal.mayaState() == om.MGlobal.kInteractive:
+            self.attachPanels()
+            # New panels can be made at any time, like when a scene restores its layout or a panel is torn off
+            self.__callbackIDs.append(om.MEventMessage.addEventCallback('modelEditorChanged', self.attachPanels))
+            SceneCallbackManager.instance().registerAfterOpen(self.attachPanels)
+
+    def stop(self):
+        """Removes every callback we've registered"""
+        for panelCallbackIDs in self.__panelCallbacks.values():
+            om.MMessage.removeCallbacks(panelCallbackIDs)
+        om.MMessage.removeCallbacks(self.__callbackIDs)
+
+        manager = SceneCallbackManager.instance()
+        manager.deregisterNodeRemoved(self.locatorRemoved, nodeType=CustomLocator.name)
+        manager.deregisterAfterOpen(self.attachPanels)
+
+        self.__panelCallbacks = {}
+        self.__callbackIDs = []
+        self.generations = {}
+        self.__selected = set()
+
+    def attachPanels(self, *args):
+        """Starts counting the frames of any model panels we aren't already listening to"""
+        for panel in cmds.getPanel(type='modelPanel') or []:
+            if panel in self.__panelCallbacks:
+                continue
+            try:
+                self.__panelCallbacks[panel] = [
+                    omui.MUiMessage.add3dViewPostRenderMsgCallback(panel, self.frameDrawn),
+                    omui.MUiMessage.add3dViewDestroyMsgCallback(panel, self.panelDestroyed, panel),
+                ]
+            except RuntimeError:
+                # Panels that exist but don't have a viewport yet can't have callbacks, so we'll try again later
+                continue
+
+    def panelDestroyed(self, panel, *args):
+        om.MMessage.removeCallbacks(self.__panelCallbacks.pop(panel, []))
+
+    def locatorRemoved(self, node):
+        # Once the locator is deleted we don't need to remember its generation any more
+        # If the delete is undone, it simply starts again from the first generation
+        self.generations.pop(om.MObjectHandle(node).hashCode(), None)
+        self.__selected.discard(om.MObjectHandle(node).hashCode())
+        self.markMoved()
+
+    def generation(self, node):
+        """Returns the current generation of the locator"""
+        return self.generations.get(om.MObjectHandle(node).hashCode(), 0)
+
+    def markDirty(self, node):
+        """Marks the locator as needing a refresh the next time it's drawn"""
+        self.markDirtyByKey(om.MObjectHandle(node).hashCode())
+
+    def markDirtyByKey(self, key):
+        self.generations[key] = self.generations.get(key, 0) + 1
+        self.version += 1
+
+    def markMoved(self, *args):
+        """Lets the subscene override know that something has changed without changing a locator's generation"""
+        self.version += 1
+
+    def selectionChanged(self, clientData):
+        # Selecting a locator, or anything above it, changes the color it's drawn with
+        # So we find all the locators under everything that's selected
+        selected = set()
+        selection = om.MGlobal.getActiveSelectionList()
+        iterator = om.MItDag(om.MItDag.kDepthFirst, om.MFn.kPluginLocatorNode)
+        for i in range(selection.length()):
+            try:
+                path = selection.getDagPath(i)
+            except (TypeError, RuntimeError):
+                # Dependency nodes don't have DAG paths, so they can't be locators
+                continue
+
+            iterator.reset(path, om.MItDag.kDepthFirst, om.MFn.kPluginLocatorNode)
+            while not iterator.isDone():
+                node = iterator.currentItem()
+                if om.MFnDependencyNode(node).typeId == CustomLocator.id:
+                    selected.add(om.MObjectHandle(node).hashCode())
+                iterator.next()
+
+        # Only the locators that were selected before or are selected now need to be refreshed
+        for key in selected | self.__selected:
+            self.markDirtyByKey(key)
+        self.__selected = selected
+
+    def frameDrawn(self, panel, clientData):
+        # A viewport finished drawing, so we store the counts for this frame and start counting again
+        self.lastFrame = {'refreshed': self.refreshed, 'skipped': self.skipped, 'drawn': self.drawn}
+        self.refreshed = 0
+        self.skipped = 0
+        self.drawn = dict.fromkeys(self.drawn, 0)
+
+
+# We only need one tracker for all of our locators
+tracker = LocatorTracker()
+
+# And one batch for all of the locators drawn with the subscene override
+batch = SubSceneBatch()
+
+
+def getLocatorColor(locator):
+    """Gets the color set on the locator node as an MColor"""
+    # We get the color plug and try and get its value
+    colorPlug = om.MPlug(locator, CustomLocator.color)
+    if colorPlug.isNull:
+        # If it can't be fetched then default it
+        return om.MColor((0.5, 0.3, 0.3))
+
+    # If it is available, then lets get the color
+    color = []
+    # The color is a compound attribute so we need to get all the children
+    # We do this by looping through it
+    for channel in range(colorPlug.numChildren()):
+        channelPlug = colorPlug.child(channel)
+        color.append(channelPlug.asFloat())
+    return om.MColor(color)
+
+
+class ShapeGeometry(object):
+    """
+    Holds the lines and triangles needed to draw a single shape.
+    One of these is built for each shape and then shared by every locator drawing that shape,
+    so they must be treated as read only.
+    """
+
+    def __init__(self, points, triangles, bounds, simplified):
         self.lineList = om.MPointArray()  # The list of lines to draw
         self.triangleList = om.MPointArray()  # A list of triangles to draw
+        # The bounding box of the shape, which lets Maya skip drawing locators that are out of view
+        self.bounds = om.MBoundingBox(om.MPoint(bounds[0]), om.MPoint(bounds[1]))
+        # The corners of the bounding box, which we use to work out how big the shape is on screen
+        self.corners = [om.MPoint(corner) for corner in itertools.product(*zip(*bounds))]
+
+        # We start out by defining the lines of this shape
+        # These consist of two points, each with an xyz
+        for i in range(len(points) - 1):
+            self.lineList.append(om.MPoint(points[i]))
+            self.lineList.append(om.MPoint(points[i + 1]))
+
+        # Then lets construct the triangles that will fill out this shape.
+        # These were worked out by the library so they also work for concave shapes
+        for triangle in triangles:
+            for index in triangle:
+                self.triangleList.append(om.MPoint(points[index]))
+
+        # Finally the lines for the simplified outline we draw when the shape is small on screen
+        self.simplifiedLineList = om.MPointArray()
+        for i in range(len(simplified) - 1):
+            self.simplifiedLineList.append(om.MPoint(simplified[i]))
+            self.simplifiedLineList.append(om.MPoint(simplified[i + 1]))
+
+
+def isLodActive():
+    """Returns whether any locators can be drawn with less than full detail"""
+    return lodThresholds['fullSize'] > 0
+
+
+def setLodThresholds(fullSize=None, pointSize=None):
+    """
+    Sets the sizes in pixels where locators switch between levels of detail
+    They're off by default, and setting both to 0 turns them off again, so every locator is drawn fully.
+    Turning them on or off only affects locators drawn after the scene is reopened, since it changes
+    whether Maya redraws them every frame.
+
+    :param fullSize: Locators at least this many pixels across are drawn with every line and triangle
+    :param pointSize: Locators smaller than this many pixels across are drawn as a single point
+    """
+    if fullSize is not None:
+        lodThresholds['fullSize'] = float(fullSize)
+    if pointSize is not None:
+        lodThresholds['pointSize'] = float(pointSize)
+
+
+def projectedSize(geometry, objPath, frameContext):
+    """Returns roughly how many pixels across the shape is on screen"""
+    # This matrix takes us from the locators space all the way to the screen
+    matrix = objPath.inclusiveMatrix() * frameContext.getMatrix(omr.MFrameContext.kViewProjMtx)
+    _, _, width, height = frameContext.getViewportDimensions()
+
+    xs = []
+    ys = []
+    for corner in geometry.corners:
+        point = corner * matrix
+        # If any of it is behind the camera we can't tell how big it is, so we treat it as big
+        if point.w <= 0:
+            return float('inf')
+        xs.append(point.x / point.w)
+        ys.append(point.y / point.w)
+
+    # The screen goes from -1 to 1, so we halve the size before scaling it by the viewport size
+    return max((max(xs) - min(xs)) * width, (max(ys) - min(ys)) * height) / 2.0
+
+
+def chooseLod(geometry, objPath, frameContext):
+    """Picks the level of detail to draw the shape with"""
+    size = projectedSize(geometry, objPath, frameContext)
+    if size >= lodThresholds['fullSize']:
+        return kFullLod
+    if size >= lodThresholds['pointSize']:
+        return kSimplifiedLod
+    return kPointLod
+
+
+def getShapeGeometry(index):
+    """Gets the shared geometry for the shape at the index, building it the first time it's requested"""
+    geometry = shapeGeometry.get(index)
+    if geometry is None:
+        if index is None or not 0 <= index < len(shapeNames):
+            return None
+        geometry = shapeGeometry[index] = ShapeGeometry(
+            library.points(index),
+            library.triangles(index),
+            library.bounds(index),
+            library.simplified(index)
+        )
+    return geometry
 
 
-def initializePlugin(plugin):
-    # We'll update the list when the plugin is initialized in case it changes
-    global shapeNames
-    shapeNames = sorted(shapes.keys())
+class ShapeBuffers(object):
+    """
+    Holds the GPU buffers needed to draw a single shape with the subscene override.
+    Like the ShapeGeometry, one of these is built for each shape and shared by every render item that draws it.
+    """
+
+    def __init__(self, geometry):
+        # The bounds of the shape let Maya know how big the render items are so it can cull them
+        self.bounds = geometry.bounds
+
+        self.__buffers = {
+            omr.MGeometry.kLines: self.createBuffers(geometry.lineList),
+            omr.MGeometry.kTriangles: self.createBuffers(geometry.triangleList),
+        }
+
+    def get(self, primitive):
+        """Returns the (MVertexBufferArray, MIndexBuffer) for the primitive type"""
+        return self.__buffers[primitive]
 
-    # Also lets make sure this directory is in the path so we can load our attribute editor templat
-    dirName = 'E:\Projects\AdvancedPythonForMaya\Scene'
+    @staticmethod
+    def createBuffers(points):
+        count = len(points)
+
+        # We fill the positions into a vertex buffer
+        # The buffer gives us a memory address which we write our floats into using ctypes
+        descriptor = omr.MVertexBufferDescriptor('', omr.MGeometry.kPosition, omr.MGeometry.kFloat, 3)
+        vertexBuffer = omr.MVertexBuffer(descriptor)
+        if count:
+            address = vertexBuffer.acquire(count, True)
+            positions = ((ctypes.c_float * 3) * count).from_address(address)
+            for i in range(count):
+                point = points[i]
+                positions[i][0] = point.x
+                positions[i][1] = point.y
+                positions[i][2] = point.z
+            vertexBuffer.commit(address)
+
+        vertexBuffers = omr.MVertexBufferArray()
+        vertexBuffers.append(vertexBuffer, 'positions')
+
+        # Our points are already in draw order so the indices just count up
+        indexBuffer = omr.MIndexBuffer(omr.MGeometry.kUnsignedInt32)
+        if count:
+            address = indexBuffer.acquire(count, True)
+            indices = (ctypes.c_uint * count).from_address(address)
+            for i in range(count):
+                indices[i] = i
+            indexBuffer.commit(address)
+
+        return vertexBuffers, indexBuffer
+
+
+# The GPU buffers for each shape, keyed by the index of the shape, just like the shapeGeometry
+shapeBuffers = {}
+
+
+def getShapeBuffers(index):
+    """Gets the shared GPU buffers for the shape at the index, building them the first time they're requested"""
+    buffers = shapeBuffers.get(index)
+    if buffers is None:
+        geometry = getShapeGeometry(index)
+        if geometry is None:
+            return None
+        buffers = shapeBuffers[index] = ShapeBuffers(geometry)
+    return buffers
+
+
+def loadShapes():
+    """Loads the shape library, falling back to the shapes defined above if there isn't one"""
+    global library, shapeNames, shapeGeometry, shapeBuffers
+    library.close()
+    # Only the index of the library is read here, so this stays fast no matter how many shapes there are
+    library = shapeLibrary.loadLibrary(os.getenv(kShapeLibraryEnvVar), shapes)
+    shapeNames = library.names
+    shapeGeometry = {}
+    shapeBuffers = {}
+
+
+def initializePlugin(plugin):
+    # We'll load the shapes when the plugin is initialized in case they've changed
+    loadShapes()
+
+    # Then we see which way we've been asked to draw our locators
+    # The classification tells Maya which kind of override to look for, so it has to be set before registering
+    global drawMode
+    drawMode = os.getenv(kDrawModeEnvVar) or kDrawOverrideMode
+    if drawMode == kSubSceneMode:
+        CustomLocator.drawDbClassification = "drawdb/subscene/customLocator"
+    else:
+        drawMode = kDrawOverrideMode
+        CustomLocator.drawDbClassification = "drawdb/geometry/customLocator"
+
+    # Also lets make sure this directory is in the path so we can load our attribute editor template
+    # The template lives next to this file, so we work out its directory rather than hardcoding it
+    dirName = os.path.dirname(os.path.abspath(__file__))
     # Maya will look for the environment vairable, MAYA_SCRIPT_PATH to look for scripts
-    MAYA_SCRIPT_PATH = os.getenv('MAYA_SCRIPT_PATH')
-    if dirName not in MAYA_SCRIPT_PATH:
+    # It might not be set at all, for example in a fresh mayapy session
+    scriptPaths = [path for path in os.getenv('MAYA_SCRIPT_PATH', '').split(os.pathsep) if path]
+    if dirName not in scriptPaths:
         # os.pathsep gives us the character that separates paths on your specific operating system
-        MAYA_SCRIPT_PATH += (os.pathsep + dirName)
-        os.environ['MAYA_SCRIPT_PATH'] = MAYA_SCRIPT_PATH
+        scriptPaths.append(dirName)
+        os.environ['MAYA_SCRIPT_PATH'] = os.pathsep.join(scriptPaths)
 
     pluginFn = om.MFnPlugin(plugin)
 
@@ -282,7 +892,22 @@ def initializePlugin(plugin):
         om.MGlobal.displayError('Failed to register node %s' % CustomLocator.name)
         raise
 
+    # Start tracking which locators need to be redrawn
+    tracker.start()
+
     # Next we register the override for Viewport 2 to use
+    if drawMode == kSubSceneMode:
+        try:
+            omr.MDrawRegistry.registerSubSceneOverrideCreator(
+                CustomLocator.drawDbClassification,
+                CustomLocator.drawRegistrantId,
+                CustomLocatorSubSceneOverride.creator
+            )
+        except:
+            om.MGlobal.displayError('Failed to register override: %s' % CustomLocatorSubSceneOverride.name)
+            raise
+        return
+
     try:
         omr.MDrawRegistry.registerDrawOverrideCreator(
             CustomLocator.drawDbClassification,  # The Viewport2 classification,
@@ -295,6 +920,15 @@ def initializePlugin(plugin):
 
 
 def uninitializePlugin(plugin):
+    # Stop tracking our locators
+    tracker.stop()
+    batch.clear()
+
+    # Let go of the shape library file and the shared buffers
+    library.close()
+    shapeGeometry.clear()
+    shapeBuffers.clear()
+
     pluginFn = om.MFnPlugin(plugin)
 
     try:
@@ -303,6 +937,17 @@ def uninitializePlugin(plugin):
         om.MGlobal.displayError('Failed to deregister node %s' % CustomLocator.name)
         raise
 
+    if drawMode == kSubSceneMode:
+        try:
+            omr.MDrawRegistry.deregisterSubSceneOverrideCreator(
+                CustomLocator.drawDbClassification,
+                CustomLocator.drawRegistrantId
+            )
+        except:
+            om.MGlobal.displayError('Failed to deregister override %s' % CustomLocatorSubSceneOverride.name)
+            raise
+        return
+
     try:
         omr.MDrawRegistry.deregisterDrawOverrideCreator(
             CustomLocator.drawDbClassification,
@@ -327,4 +972,20 @@ finally:
     mc.loadPlugin(customLocator.__file__)
 
 mc.createNode('customLocator')
+
+To see how many locators were refreshed and skipped in the last frame.
+Maya loads the plugin as its own customLocator module, so we need that copy rather than the one we imported above
+
+from Utilities import pluginLoader
+plugin = pluginLoader.pluginModule('customLocator')
+print(plugin.tracker.lastFrame)
+
+To turn on the levels of detail, before creating any locators
+
+plugin.setLodThresholds(**plugin.kDefaultLodThresholds)
+
+To compare frame times with the subscene override, set the draw mode before loading the plugin
+
+import os
+os.environ['CUSTOM_LOCATOR_DRAW_MODE'] = 'subScene'
 """
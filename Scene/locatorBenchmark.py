@@ -0,0 +1,147 @@
+# This benchmark shows how much faster the viewport is when Maya can cull locators that are out of view
+# It builds a scene with lots of locators where most of them are off screen,
+# then times the viewport with our bounding boxes turned on and turned off.
+#
+# Each of these is registered with the benchmark runner in Intro/benchmark.py.
+# They need a viewport to draw in, so they have to be run inside an interactive Maya session:
+#
+# from Intro import benchmark
+# from Scene import locatorBenchmark
+# benchmark.run(['locators.unbounded', 'locators.bounded'])
+#
+# The lod cases turn the levels of detail on and time the viewport with the camera further and further away,
+# and lodLevels reports how many locators were drawn at each level of detail
+#
+# benchmark.run(['locators.lod.20', 'locators.lod.200', 'locators.lod.2000'])
+# locatorBenchmark.lodLevels()
+from __future__ import division, print_function
+
+import random
+
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaRender as omr
+import maya.cmds as cmds
+
+from Intro import benchmark
+from Utilities import pluginLoader
+
+# How many locators the culling cases create, and the fraction of them that are in view of the camera
+kLocatorCount = 10000
+kOnScreen = 0.05
+
+# How many locators the level of detail cases create, and how far away from them we put the camera
+kLodLocatorCount = 1000
+kLodDistances = (20, 200, 2000)
+
+
+def buildScene(count=kLocatorCount, onScreen=kOnScreen, seed=0):
+    """Creates a new scene with count locators, where only the onScreen fraction of them can be seen"""
+    cmds.file(new=True, force=True)
+    pluginLoader.loadPlugin('customLocator')
+
+    # Point the camera straight at the origin
+    cmds.setAttr('persp.translate', 0, 0, 50)
+    cmds.setAttr('persp.rotate', 0, 0, 0)
+
+    rand = random.Random(seed)
+    visible = int(count * onScreen)
+    for i in range(count):
+        transform = cmds.createNode('transform', name='benchmarkLocator%d' % i)
+        cmds.createNode('customLocator', parent=transform)
+        if i < visible:
+            # These are spread out in front of the camera
+            position = (rand.uniform(-10, 10), rand.uniform(-10, 10), rand.uniform(-10, 10))
+        else:
+            # And these are all behind it where it can't see them
+            position = (rand.uniform(-500, 500), rand.uniform(-500, 500), rand.uniform(100, 1000))
+        cmds.setAttr(transform + '.translate', *position)
+
+    return visible
+
+
+def dirtyLocators():
+    """Lets Maya know it needs to ask our locators for their bounding boxes again"""
+    selection = om.MSelectionList()
+    for node in cmds.ls(type='customLocator'):
+        selection.add(node)
+    for i in range(selection.length()):
+        omr.MRenderer.setGeometryDrawDirty(selection.getDependNode(i))
+
+
+def setBounded(bounded):
+    pluginLoader.pluginModule('customLocator').CustomLocator.bounded = bounded
+    dirtyLocators()
+
+
+def refresh(*args):
+    """Forces the viewport to redraw"""
+    cmds.refresh(currentView=True, force=True)
+
+
+def registerCullingCase(bounded):
+    def setup():
+        buildScene()
+        setBounded(bounded)
+
+    # Leave the locators bounded afterwards, which is the default
+    name = 'locators.bounded' if bounded else 'locators.unbounded'
+    benchmark.register(name, setup=setup, teardown=lambda *args: setBounded(True))(refresh)
+
+
+def moveCamera(distance):
+    """Moves the camera away from the locators. Only the camera moves, so nothing about the locators is dirty"""
+    cmds.setAttr('persp.translateZ', distance)
+
+
+def setLod(active):
+    """
+    Turns the levels of detail on or off.
+    Whether Maya redraws the locators every frame is decided when they're created, so this has to come before buildScene
+    """
+    plugin = pluginLoader.pluginModule('customLocator')
+    if active:
+        plugin.setLodThresholds(**plugin.kDefaultLodThresholds)
+    else:
+        plugin.setLodThresholds(0, 0)
+
+
+def registerLodCase(distance):
+    def setup():
+        setLod(True)
+        # The locators are all in view, and they're the same for every distance so we only build them once
+        if len(cmds.ls(type='customLocator') or []) != kLodLocatorCount:
+            buildScene(kLodLocatorCount, onScreen=1.0)
+        moveCamera(distance)
+
+    # Leave the levels of detail off afterwards, which is the default
+    benchmark.register('locators.lod.%s' % distance, setup=setup, teardown=lambda *args: setLod(False))(refresh)
+
+
+def lodLevels(distances=kLodDistances):
+    """
+    Moves the camera away from the locators and checks that the level of detail they're drawn with follows it.
+    The camera moving doesn't change the locators at all, so this shows that they're still redrawn.
+
+    :return: A list of (distance, {level: count}) with how many locators were drawn at each level
+    """
+    setLod(True)
+    try:
+        buildScene(kLodLocatorCount, onScreen=1.0)
+        plugin = pluginLoader.pluginModule('customLocator')
+
+        levels = []
+        for distance in distances:
+            moveCamera(distance)
+            refresh()
+            drawn = dict(plugin.tracker.lastFrame['drawn'])
+            levels.append((distance, drawn))
+            print('Camera at %6s: drawn %s' % (distance, drawn))
+    finally:
+        setLod(False)
+    return levels
+
+
+for bounded in (False, True):
+    registerCullingCase(bounded)
+for distance in kLodDistances:
+    registerLodCase(distance)
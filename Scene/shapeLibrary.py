@@ -0,0 +1,305 @@
+# The shape library stores the outlines our custom locator can draw
+# Rather than hardcoding every shape in the plugin, we keep them in a compact binary file.
+# This lets a studio have hundreds of shapes, some with thousands of points, without slowing down plugin load.
+#
+# The file is laid out as:
+#   * A header: the magic bytes, the format version and the number of shapes
+#   * An index with one entry per shape: the length of its name, the name, the offset of its points and point count
+#   * The point blocks: float32 x, y, z values for each point of each shape
+#
+# The index is sorted by name, so the list of shape names can be read without touching any point data.
+# The file is memory mapped and the points of a shape are only read the first time it's used.
+#
+# To build a library from a JSON file of {shapeName: [[x, y, z], ...]} run:
+#   python -m Scene.shapeLibrary shapes.json shapes.shapelib
+from __future__ import print_function
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+from Scene import triangulate
+
+# When simplifying an outline, points closer than this fraction of the shape's size to the line are dropped
+kSimplifyTolerance = 0.05
+
+kMagic = b'CLSL'
+kVersion = 1
+
+# The header is the magic bytes, the version and the shape count
+kHeader = struct.Struct('<4sII')
+# Each index entry starts with the length of the name, which is followed by the name itself
+kNameLength = struct.Struct('<H')
+# After the name comes the byte offset of the points and the number of points
+kEntry = struct.Struct('<QI')
+# Each point is three float32 values
+kPointSize = 3 * 4
+
+
+def packFloats(values):
+    """Packs a list of floats into little endian float32 bytes"""
+    values = array('f', values)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    # Python 3 renamed tostring to tobytes
+    return values.tobytes() if hasattr(values, 'tobytes') else values.tostring()
+
+
+def unpackFloats(data):
+    """Unpacks little endian float32 bytes into an array of floats"""
+    values = array('f')
+    if hasattr(values, 'frombytes'):
+        values.frombytes(data)
+    else:
+        values.fromstring(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def calculateBounds(points):
+    """Returns the ((minX, minY, minZ), (maxX, maxY, maxZ)) bounding box of the points"""
+    if not points:
+        return (0.0, 0.0, 0.0), (0.0, 0.0, 0.0)
+    # zip(*points) gives us all the x values, then all the y values and then all the z values
+    axes = list(zip(*points))[:3]
+    return tuple(min(axis) for axis in axes), tuple(max(axis) for axis in axes)
+
+
+def distanceToSegment(point, start, end):
+    """Returns the distance from the point to the line segment between start and end"""
+    segment = [end[axis] - start[axis] for axis in range(3)]
+    offset = [point[axis] - start[axis] for axis in range(3)]
+    lengthSquared = sum(value * value for value in segment)
+    # Work out how far along the segment the closest point is, keeping it between the two ends
+    t = 0.0
+    if lengthSquared:
+        t = max(0.0, min(1.0, sum(offset[axis] * segment[axis] for axis in range(3)) / lengthSquared))
+    closest = [offset[axis] - segment[axis] * t for axis in range(3)]
+    return sum(value * value for value in closest) ** 0.5
+
+
+def simplify(points, tolerance):
+    """
+    Simplifies an outline using the Ramer-Douglas-Peucker algorithm.
+    It keeps the first and last points, and then only keeps the points that are further than the tolerance
+    from the line between the points we're keeping.
+    """
+    if len(points) < 3:
+        return list(points)
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    # Rather than recursing, we use a stack of the ranges we still need to check
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        furthest, distance = None, tolerance
+        for i in range(first + 1, last):
+            pointDistance = distanceToSegment(points[i], points[first], points[last])
+            if pointDistance > distance:
+                furthest, distance = i, pointDistance
+
+        # If a point is too far away we keep it, and then check either side of it
+        if furthest is not None:
+            keep[furthest] = True
+            stack.append((first, furthest))
+            stack.append((furthest, last))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+class ShapeLibrary(object):
+    """
+    The base class for our shape libraries.
+    It keeps a list of shape names and loads the points of each shape the first time they're requested.
+    """
+
+    def __init__(self, names):
+        # The names are stored in the order of the index, which is also the order of the shape attribute
+        self.names = list(names)
+        # The points of each shape we've loaded so far, keyed by the index of the shape
+        self.__points = {}
+        # The triangles that fill in each shape, which are worked out once alongside the points
+        self.__triangles = {}
+        # The bounding box of each shape, which we work out as soon as its points are loaded
+        self.__bounds = {}
+        # The simplified outline of each shape, which is used when the shape is drawn very small
+        self.__simplified = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def index(self, name):
+        """Returns the index of the shape with the given name"""
+        return self.names.index(name)
+
+    def points(self, index):
+        """Returns the points of the shape at the given index as a list of (x, y, z) tuples"""
+        points = self.__points.get(index)
+        if points is None:
+            points = self.__points[index] = self._load(index)
+            self.__bounds[index] = calculateBounds(points)
+        return points
+
+    def bounds(self, index):
+        """Returns the ((minX, minY, minZ), (maxX, maxY, maxZ)) bounding box of the shape at the given index"""
+        bounds = self.__bounds.get(index)
+        if bounds is None:
+            self.points(index)
+            bounds = self.__bounds[index]
+        return bounds
+
+    def triangles(self, index):
+        """Returns the triangles that fill the shape at the given index as a list of (a, b, c) point indices"""
+        triangles = self.__triangles.get(index)
+        if triangles is None:
+            triangles = self.__triangles[index] = triangulate.earClip(self.points(index))
+        return triangles
+
+    def simplified(self, index):
+        """Returns the points of a simplified outline of the shape at the given index"""
+        simplified = self.__simplified.get(index)
+        if simplified is None:
+            points = self.points(index)
+            low, high = self.bounds(index)
+            size = max(high[axis] - low[axis] for axis in range(3))
+            simplified = self.__simplified[index] = simplify(points, size * kSimplifyTolerance)
+        return simplified
+
+    def isLoaded(self, index):
+        """Returns whether the points of the shape have been read yet"""
+        return index in self.__points
+
+    def close(self):
+        pass
+
+    def _load(self, index):
+        raise NotImplementedError
+
+
+class MemoryShapeLibrary(ShapeLibrary):
+    """A shape library for shapes that are already in memory, like the default shapes of the locator"""
+
+    def __init__(self, shapes):
+        super(MemoryShapeLibrary, self).__init__(sorted(shapes.keys()))
+        self.__shapes = shapes
+
+    def _load(self, index):
+        return [tuple(point) for point in self.__shapes[self.names[index]]]
+
+
+class FileShapeLibrary(ShapeLibrary):
+    """A shape library that memory maps a library file and reads its points lazily"""
+
+    def __init__(self, path):
+        self.path = path
+
+        # We memory map the file so only the pages we actually read get loaded from disk
+        with open(path, 'rb') as f:
+            self.__mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            names = self.__readIndex()
+        except Exception:
+            # Don't leave the file mapped if it turns out not to be a library we can read
+            self.__mapped.close()
+            raise
+
+        super(FileShapeLibrary, self).__init__(names)
+
+    def __readIndex(self):
+        """Reads the header and the index, returning the shape names. None of the points are read."""
+        magic, version, count = kHeader.unpack_from(self.__mapped, 0)
+        if magic != kMagic:
+            raise ValueError('%s is not a shape library' % self.path)
+        if version != kVersion:
+            raise ValueError('%s uses version %s of the shape library format, expected %s' % (
+                self.path, version, kVersion
+            ))
+
+        names = []
+        self.__blocks = []
+        offset = kHeader.size
+        for _ in range(count):
+            nameLength, = kNameLength.unpack_from(self.__mapped, offset)
+            offset += kNameLength.size
+            names.append(self.__mapped[offset:offset + nameLength].decode('utf-8'))
+            offset += nameLength
+            block = kEntry.unpack_from(self.__mapped, offset)
+            offset += kEntry.size
+
+            # A truncated file would otherwise only show up later as a shape with missing points
+            if block[0] + block[1] * kPointSize > len(self.__mapped):
+                raise ValueError('%s is truncated' % self.path)
+            self.__blocks.append(block)
+        return names
+
+    def _load(self, index):
+        offset, count = self.__blocks[index]
+        values = unpackFloats(self.__mapped[offset:offset + count * kPointSize])
+        return [tuple(values[i:i + 3]) for i in range(0, len(values), 3)]
+
+    def close(self):
+        self.__mapped.close()
+
+
+def writeLibrary(path, shapes):
+    """
+    Writes shapes to a shape library file
+
+    :param path: The path to write the library to
+    :param shapes: A dictionary of {shapeName: [[x, y, z], ...]}
+    """
+    names = sorted(shapes.keys())
+    encodedNames = [name.encode('utf-8') for name in names]
+
+    # First we need to know how big the index is so we know where the points start
+    indexSize = kHeader.size + sum(kNameLength.size + len(name) + kEntry.size for name in encodedNames)
+
+    index = [kHeader.pack(kMagic, kVersion, len(names))]
+    blocks = []
+    offset = indexSize
+    for name, encodedName in zip(names, encodedNames):
+        points = shapes[name]
+        data = packFloats([float(value) for point in points for value in point[:3]])
+
+        index.append(kNameLength.pack(len(encodedName)))
+        index.append(encodedName)
+        index.append(kEntry.pack(offset, len(points)))
+        blocks.append(data)
+        offset += len(data)
+
+    with open(path, 'wb') as f:
+        f.write(b''.join(index))
+        f.write(b''.join(blocks))
+
+
+def loadLibrary(path=None, shapes=None):
+    """
+    Loads the shape library at the path.
+    If no path is given, or it can't be read, the given shapes are used instead.
+    """
+    if path:
+        try:
+            return FileShapeLibrary(path)
+        except (IOError, OSError, ValueError, UnicodeDecodeError, struct.error) as e:
+            if shapes is None:
+                raise
+            # We only need Maya here, so that building a library from the command line doesn't need it
+            from maya.api import OpenMaya as om
+            om.MGlobal.displayWarning(
+                'Could not read shape library %s, using the default shapes instead: %s' % (path, e)
+            )
+    return MemoryShapeLibrary(shapes or {})
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('Usage: python -m Scene.shapeLibrary shapes.json shapes.shapelib')
+        sys.exit(1)
+
+    with open(sys.argv[1]) as f:
+        writeLibrary(sys.argv[2], json.load(f))
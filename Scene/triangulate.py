@@ -0,0 +1,99 @@
+# To fill in the shapes of our locator we need to split their outlines into triangles
+# A simple fan from the first point only works for convex shapes, so instead we use ear clipping.
+#
+# Ear clipping works by repeatedly finding an "ear": three neighbouring points that form a triangle
+# that is inside the shape and doesn't contain any other point.
+# We cut that triangle off, and keep going until there is only one triangle left.
+#
+# It's slower than a fan, but we only ever do it once per shape.
+
+# Anything smaller than this is treated as zero, so nearly straight corners don't cause problems
+kEpsilon = 1e-9
+
+
+def newellNormal(points):
+    """Returns the normal of the plane that best fits the outline using Newell's method"""
+    nx = ny = nz = 0.0
+    count = len(points)
+    for i in range(count):
+        x1, y1, z1 = points[i][:3]
+        x2, y2, z2 = points[(i + 1) % count][:3]
+        nx += (y1 - y2) * (z1 + z2)
+        ny += (z1 - z2) * (x1 + x2)
+        nz += (x1 - x2) * (y1 + y2)
+    return nx, ny, nz
+
+
+def projectTo2D(points):
+    """Flattens the outline onto the axis plane it's most aligned with so we can work in 2D"""
+    normal = newellNormal(points)
+    # We drop the axis the normal points along the most
+    dropped = max(range(3), key=lambda axis: abs(normal[axis]))
+    u, v = [axis for axis in range(3) if axis != dropped]
+    return [(point[u], point[v]) for point in points]
+
+
+def cross(a, b, c):
+    """Returns twice the signed area of the triangle abc. It's positive if the points turn left"""
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+
+def containsPoint(a, b, c, point):
+    """Returns whether the point is inside or on the edge of the counter clockwise triangle abc"""
+    return cross(a, b, point) >= -kEpsilon and cross(b, c, point) >= -kEpsilon and cross(c, a, point) >= -kEpsilon
+
+
+def earClip(points):
+    """
+    Splits a closed outline into triangles
+
+    :param points: A list of [x, y, z] points around the outline. It can be convex or concave.
+    :return: A list of (a, b, c) tuples of indices into the points, one per triangle
+    """
+    count = len(points)
+    # Some outlines repeat the first point at the end to close them, which we don't need
+    if count > 1 and tuple(points[0][:3]) == tuple(points[-1][:3]):
+        count -= 1
+    if count < 3:
+        return []
+
+    flat = projectTo2D(points[:count])
+
+    # We want to walk around the outline counter clockwise, so if the area is negative we go the other way
+    area = sum(cross((0.0, 0.0), flat[i], flat[(i + 1) % count]) for i in range(count))
+    remaining = list(range(count)) if area >= 0 else list(range(count - 1, -1, -1))
+
+    triangles = []
+    while len(remaining) > 3:
+        size = len(remaining)
+        for i in range(size):
+            previous, current, following = remaining[i - 1], remaining[i], remaining[(i + 1) % size]
+            a, b, c = flat[previous], flat[current], flat[following]
+
+            turn = cross(a, b, c)
+            if abs(turn) <= kEpsilon:
+                # The point is in a straight line with its neighbours, so it doesn't change the shape
+                del remaining[i]
+                break
+            if turn < 0:
+                # The corner points inwards, so this can't be an ear
+                continue
+
+            # If any other point is inside this triangle, cutting it off would cut into the shape
+            if any(containsPoint(a, b, c, flat[other]) for other in remaining
+                   if other not in (previous, current, following)):
+                continue
+
+            triangles.append((previous, current, following))
+            del remaining[i]
+            break
+        else:
+            # If we can't find an ear, the outline crosses over itself
+            # We still cut off a triangle so that we always finish and draw something
+            triangles.append((remaining[-1], remaining[0], remaining[1]))
+            del remaining[0]
+
+    # Whatever is left over is the last triangle, unless it's just a straight line
+    if len(remaining) == 3 and abs(cross(*[flat[index] for index in remaining])) > kEpsilon:
+        triangles.append(tuple(remaining))
+    return triangles
@@ -0,0 +1,402 @@
+# Intro/standalone.py shows how to use Maya without its interface, but only on the one scene that's already open.
+# Nightly jobs often need to run the same check or fix over thousands of scenes, and doing them one after another
+# only uses a single core and stops everything if one scene hangs or crashes Maya.
+#
+# The batch processor starts a few worker processes, each with its own maya.standalone session,
+# and hands them scenes one at a time. For every scene the worker opens it and calls our task with its path.
+# If a scene takes longer than the timeout, or crashes the worker, the worker is killed, a new one is started,
+# and the scene is tried again a couple of times before we give up on it.
+# Workers that crash or hang while Maya is starting are replaced too, and if Maya keeps failing to start
+# the scenes that are left are reported as failed rather than stopping the whole batch.
+# Results come back as soon as each scene finishes, so we don't have to wait for the whole batch.
+#
+# The task has to be something the workers can import, so either a function at the top level of a module,
+# or its full name as a string. Since every worker starts Maya itself, don't initialize maya.standalone beforehand.
+#
+# From mayapy:
+#   mayapy -m Utilities.batchProcessor "scenes/*.ma" --task Utilities.batchProcessor.countNodes --workers 4
+#
+# Or from a script:
+#   from Utilities import batchProcessor
+#   for result in batchProcessor.process(['scenes/*.ma', 'scenes/*.mb'], 'myModule.myTask'):
+#       print(result.path, result.value)
+from __future__ import division, print_function
+
+import argparse
+import glob
+import importlib
+import itertools
+import json
+import multiprocessing
+import pickle
+import sys
+import time
+import timeit
+import traceback
+from collections import deque, namedtuple
+
+try:
+    from multiprocessing.connection import wait
+except ImportError:
+    # Python 2 doesn't have wait, so we check each connection in turn until one has something for us
+    def wait(connections, timeout):
+        deadline = timeit.default_timer() + timeout
+        while True:
+            ready = [connection for connection in connections if connection.poll()]
+            if ready or timeit.default_timer() >= deadline:
+                return ready
+            time.sleep(0.01)
+
+# How many seconds a single scene can take before we kill the worker running it
+kDefaultTimeout = 600
+
+# How many more times we try a scene that timed out or crashed its worker
+kDefaultRetries = 2
+
+# How many seconds a worker can take to start Maya before we kill it
+kStartupTimeout = 300
+
+# How many workers in a row can fail to start Maya before we give up on the rest of the batch
+kStartupRetries = 3
+
+# How often we check on the workers while waiting for results, in seconds
+kPollInterval = 0.5
+
+# How long we give a worker to shut down cleanly once the batch is done, in seconds
+kShutdownTimeout = 10
+
+Result = namedtuple('Result', [
+    # The scene that was processed
+    'path',
+    # What the task returned, or None if it failed
+    'value',
+    # None if the task worked, otherwise a description of what went wrong
+    'error',
+    # How many times we tried the scene
+    'attempts',
+    # How long the last attempt took in seconds, including opening the scene
+    'duration',
+    # The process id of the worker that ran the last attempt
+    'pid',
+])
+
+
+def expandScenes(scenes):
+    """
+    Turns a glob, a path or a list of them into a sorted list of scene paths
+
+    :param scenes: Something like 'scenes/*.ma' or ['a.ma', 'scenes/*.mb']
+    """
+    # In Python 2 paths can be either str or unicode
+    if isinstance(scenes, (str, type(u''))):
+        scenes = [scenes]
+
+    paths = []
+    for pattern in scenes:
+        # A path without any wildcards is used as is, so a missing file is reported as a failure rather than ignored
+        matches = glob.glob(pattern) if glob.has_magic(pattern) else [pattern]
+        paths.extend(sorted(matches))
+    return paths
+
+
+def loadTask(task):
+    """Returns the task function, importing it first if we were given its name"""
+    if callable(task):
+        return task
+    moduleName, _, name = task.rpartition('.')
+    return getattr(importlib.import_module(moduleName), name)
+
+
+def countNodes(path):
+    """An example task that returns how many nodes are in the scene"""
+    from maya import cmds
+    return len(cmds.ls())
+
+
+def work(task, connection):
+    """
+    The function each worker process runs.
+    It starts Maya, then opens and processes each path it's given over the connection until it's given None.
+    """
+    import maya.standalone
+    maya.standalone.initialize()
+    from maya import cmds
+
+    task = loadTask(task)
+    # Telling the main process we're ready means starting Maya doesn't count towards the first scene's timeout
+    connection.send(None)
+
+    while True:
+        path = connection.recv()
+        if path is None:
+            break
+
+        start = timeit.default_timer()
+        value = error = None
+        try:
+            cmds.file(path, open=True, force=True)
+            value = task(path)
+            # The result has to be pickled to get back to the main process
+            # If that fails when we send it, the worker would go down with it, so we check here instead
+            pickle.dumps(value)
+        except Exception:
+            value = None
+            error = traceback.format_exc()
+        duration = timeit.default_timer() - start
+
+        # Start the next scene from a clean slate so this one's nodes aren't still using memory
+        try:
+            cmds.file(new=True, force=True)
+        except Exception:
+            pass
+
+        connection.send((path, value, error, duration))
+
+    maya.standalone.uninitialize()
+
+
+class Worker(object):
+    """Keeps track of a worker process and the scene it's working on"""
+
+    def __init__(self, workerId, task):
+        self.id = workerId
+        # Each worker gets its own pipe, so we always know which scene each one is working on.
+        # A queue shared by every worker holds a lock while it sends, and a worker that dies holding it
+        # would block every other worker. With a pipe each, a worker that dies can only break its own.
+        self.connection, workerConnection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=work, args=(task, workerConnection))
+        # Daemon processes are killed if the main process exits, so we don't leave copies of Maya running
+        self.process.daemon = True
+        self.process.start()
+        # Only the worker uses its end. Closing our copy of it means we see the pipe break if the worker dies
+        workerConnection.close()
+
+        self.ready = False
+        # Set once the pipe has broken, after which we can't hear from the worker again
+        self.broken = False
+        self.spawned = timeit.default_timer()
+        # The (path, attempt) we're working on, and when we started it
+        self.job = None
+        self.started = None
+
+    def assign(self, job):
+        self.job = job
+        self.started = timeit.default_timer()
+        self.send(job[0])
+
+    def send(self, message):
+        try:
+            self.connection.send(message)
+        except (IOError, OSError, EOFError):
+            # The worker has died. The main loop sees that it's broken and deals with its job
+            self.broken = True
+
+    def receive(self):
+        """Returns the next message from the worker, or None if the worker has died"""
+        try:
+            return self.connection.recv()
+        except (IOError, OSError, EOFError):
+            self.broken = True
+
+    def isIdle(self):
+        return self.ready and self.job is None and not self.broken
+
+    def isAlive(self):
+        return not self.broken and self.process.is_alive()
+
+    def elapsed(self):
+        return timeit.default_timer() - self.started if self.job else 0
+
+    def startupTime(self):
+        """Returns how long the worker has been starting Maya for, or 0 once it's ready"""
+        return 0 if self.ready else timeit.default_timer() - self.spawned
+
+    def stop(self):
+        """Asks the worker to shut down, killing it if it doesn't in time"""
+        if self.isAlive():
+            self.send(None)
+            self.process.join(kShutdownTimeout)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        # Anything still in the pipe belongs to a scene we've already dealt with, so we throw it away
+        self.connection.close()
+
+
+def process(scenes, task, workers=None, timeout=kDefaultTimeout, retries=kDefaultRetries,
+            startupTimeout=kStartupTimeout, startupRetries=kStartupRetries):
+    """
+    Runs the task on every scene across a pool of worker processes, giving back each Result as soon as it's done.
+    Results come back in the order the scenes finish, not the order they were given in.
+
+    Scenes that time out or crash their worker are tried again.
+    Scenes where the task raises an exception aren't, since it would most likely raise again.
+    If every worker fails to start Maya, the scenes that are left come back as failed Results.
+
+    :param scenes: A glob, a path or a list of them
+    :param task: A function that takes the path of the open scene, or the full name of one like 'myModule.myTask'
+    :param workers: How many worker processes to use. Defaults to the number of cores
+    :param timeout: How many seconds a scene can take before it's killed, or None to wait forever
+    :param retries: How many more times to try a scene that timed out or crashed
+    :param startupTimeout: How many seconds a worker can take to start Maya, or None to wait forever
+    :param startupRetries: How many workers in a row can fail to start before we stop replacing them
+    """
+    paths = expandScenes(scenes)
+    if not paths:
+        return
+
+    workerCount = min(workers or multiprocessing.cpu_count(), len(paths))
+    pending = deque((path, 1) for path in paths)
+    remaining = len(paths)
+
+    ids = itertools.count()
+    pool = {}
+    # How many workers have failed to start since one last managed to, and why the last one failed
+    startupFailures = 0
+    startupError = None
+
+    def spawn():
+        worker = Worker(next(ids), task)
+        pool[worker.id] = worker
+
+    for _ in range(workerCount):
+        spawn()
+
+    try:
+        while remaining:
+            # Hand out scenes to any workers that are waiting for one
+            for worker in pool.values():
+                if pending and worker.isIdle():
+                    worker.assign(pending.popleft())
+
+            # A pipe that has broken is always ready to read, so we only wait on the ones that haven't
+            connections = dict((worker.connection, worker) for worker in pool.values() if not worker.broken)
+            for connection in wait(list(connections), kPollInterval):
+                worker = connections[connection]
+                # A pipe closes when its worker dies, which gives us None here and is dealt with below
+                message = worker.receive()
+                if worker.broken:
+                    continue
+                if message is None:
+                    worker.ready = True
+                    startupFailures = 0
+                else:
+                    path, value, error, duration = message
+                    attempt = worker.job[1]
+                    worker.job = None
+                    remaining -= 1
+                    yield Result(path, value, error, attempt, duration, worker.process.pid)
+
+            for worker in list(pool.values()):
+                if worker.isAlive():
+                    if not worker.ready:
+                        # A worker can hang while Maya is starting, before it's been given a scene to time out on
+                        if startupTimeout is None or worker.startupTime() < startupTimeout:
+                            continue
+                        error = 'Maya took longer than %ss to start' % startupTimeout
+                    elif worker.job is None or timeout is None or worker.elapsed() < timeout:
+                        continue
+                    else:
+                        error = 'Timed out after %ss' % timeout
+                else:
+                    # The pipe breaks as the worker dies, which can be a moment before the process has finished exiting
+                    worker.process.join(kShutdownTimeout)
+                    if not worker.ready:
+                        error = 'The worker exited with code %s before Maya started' % worker.process.exitcode
+                    elif worker.job is None:
+                        error = None
+                    else:
+                        error = 'The worker exited with code %s' % worker.process.exitcode
+
+                pid = worker.process.pid
+                duration = worker.elapsed()
+                worker.kill()
+                del pool[worker.id]
+
+                if not worker.ready:
+                    startupFailures += 1
+                    startupError = error
+
+                if worker.job is not None:
+                    path, attempt = worker.job
+                    if attempt <= retries:
+                        # Put it at the front so it's retried straight away rather than at the end of the batch
+                        pending.appendleft((path, attempt + 1))
+                    else:
+                        remaining -= 1
+                        yield Result(path, None, error, attempt, duration, pid)
+
+                # If Maya keeps failing to start, another worker would most likely fail the same way
+                if len(pool) < min(workerCount, remaining) and startupFailures <= startupRetries:
+                    spawn()
+
+            # Without any workers left nothing will pick up the rest of the scenes, so we fail them instead of waiting
+            if not pool and remaining:
+                while pending:
+                    path, attempt = pending.popleft()
+                    remaining -= 1
+                    yield Result(path, None, 'No worker could start Maya: %s' % startupError, attempt - 1, 0, None)
+    finally:
+        for worker in pool.values():
+            worker.stop()
+
+
+def run(scenes, task, **kwargs):
+    """
+    Processes the scenes like process does, printing each result and the throughput as it goes
+
+    :return: A list of every Result
+    """
+    paths = expandScenes(scenes)
+    results = []
+    failed = 0
+    start = timeit.default_timer()
+
+    for result in process(paths, task, **kwargs):
+        results.append(result)
+        elapsed = timeit.default_timer() - start
+        if result.error:
+            failed += 1
+            status = 'FAILED: %s' % result.error.strip().splitlines()[-1]
+        else:
+            status = 'ok'
+        print('[%d/%d] %s %.2fs (%.2f files/s) %s' % (
+            len(results), len(paths), result.path, result.duration, len(results) / elapsed, status
+        ))
+
+    elapsed = timeit.default_timer() - start
+    print('Processed %d files in %.1fs (%.2f files/s), %d failed' % (
+        len(results), elapsed, len(results) / elapsed if elapsed else 0, failed
+    ))
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Run a task over many Maya scenes in parallel')
+    parser.add_argument('scenes', nargs='+', help='The scenes to process. Globs like "scenes/*.ma" are expanded')
+    parser.add_argument('--task', default='Utilities.batchProcessor.countNodes',
+                        help='The full name of the function to run on each scene')
+    parser.add_argument('--workers', type=int, help='How many worker processes to use')
+    parser.add_argument('--timeout', type=float, default=kDefaultTimeout, help='How many seconds each scene can take')
+    parser.add_argument('--retries', type=int, default=kDefaultRetries,
+                        help='How many more times to try scenes that time out or crash')
+    parser.add_argument('--output', help='A path to write the results to as JSON')
+    args = parser.parse_args(args)
+
+    results = run(args.scenes, args.task, workers=args.workers, timeout=args.timeout, retries=args.retries)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            # Tasks can return things JSON doesn't understand, so we fall back to writing those out as text
+            json.dump([result._asdict() for result in results], f, indent=2, default=repr)
+
+    return 1 if any(result.error for result in results) else 0
+
+
+if __name__ == '__main__':
+    # Like the benchmark runner, we run the copy of this module the workers will import rather than __main__
+    from Utilities import batchProcessor
+    sys.exit(batchProcessor.main())
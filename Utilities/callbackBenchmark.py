@@ -0,0 +1,65 @@
+# This benchmark measures how long the callback manager takes to call its listeners
+# It registers 1, 100 and 10,000 listeners to a signal, then emits that signal many times
+# and times how long each dispatch takes.
+#
+# Our listeners don't do anything, so all the time measured is the overhead of the manager itself.
+#
+# Each count is registered with the benchmark runner in Intro/benchmark.py, so it can be run inside Maya or in mayapy:
+#
+#   mayapy -m Intro.benchmark callbacks.1 callbacks.100 callbacks.10000
+#
+# The runner reports the time per dispatch. Dividing it by the number of listeners gives the time per listener.
+from __future__ import division, print_function
+
+from maya.api import OpenMaya as om
+
+from Intro import benchmark
+from Utilities.callbackManager import SceneCallbackManager
+
+# We use a signal that won't fire by itself while the benchmark runs
+kSignal = om.MSceneMessage.kBeforeExport
+
+# How many listeners we register for each case
+kCounts = (1, 100, 10000)
+
+# Roughly how many listener calls each timing makes. The number of dispatches is worked out from this
+kCalls = 10000
+
+
+class Listener(object):
+    """A listener that does nothing, so we only measure the cost of calling it"""
+
+    def onSignal(self, *args):
+        pass
+
+
+def registerListeners(count):
+    """Registers count listeners to the signal and returns them, since the manager only keeps weak references"""
+    manager = SceneCallbackManager.instance()
+    # Half the listeners are methods and half are functions, since they're dispatched differently
+    listeners = [Listener().onSignal for _ in range(count - count // 2)]
+    # Each lambda is a new function, so each one is registered as a separate listener
+    listeners.extend(lambda *args: None for _ in range(count // 2))
+    for listener in listeners:
+        manager.registerBeforeExport(listener)
+    return listeners
+
+
+def deregisterListeners(listeners):
+    manager = SceneCallbackManager.instance()
+    for listener in listeners:
+        manager.deregisterBeforeExport(listener)
+
+
+def dispatch(listeners):
+    """Emits the signal once. The listeners are only passed in so they stay alive while we're timing"""
+    SceneCallbackManager.instance().emit(kSignal, None)
+
+
+for count in kCounts:
+    benchmark.register(
+        'callbacks.%d' % count,
+        setup=lambda count=count: registerListeners(count),
+        teardown=deregisterListeners,
+        number=max(1, kCalls // count),
+    )(dispatch)
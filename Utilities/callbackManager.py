@@ -1,14 +1,87 @@
+from __future__ import print_function
+
 import inspect
+import json
 import logging
+import timeit
 import weakref
+from collections import deque, OrderedDict
 from functools import partial
 
-from maya import cmds
+from maya import cmds, utils
 from maya.api import OpenMaya as om
 
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.WARNING)
+from Utilities import mayaLogging
+
+# Our logger writes to the Script Editor in batches and collapses repeats, so a callback that fails for every node
+# writes one line with a count rather than flooding it
+logger = mayaLogging.getLogger(__name__, logging.WARNING)
+
+# By default a deferred listener waits at most this many seconds before its events are delivered
+kDefaultMaxLatency = 0.25
+
+# We keep the timings of this many recent calls to each listener to work out its p50 and p99
+kSampleSize = 1000
+# By default a listener that's slower than its budget this many times in a row is quarantined
+kDefaultStrikes = 3
+
+
+class Listener(object):
+    """
+    Holds on to everything we need to call a single listener.
+    A deferred listener also collects its events here until they're delivered.
+    """
+    # Slots make these smaller and quicker to access, which matters when we have thousands of them
+    __slots__ = (
+        'reference', 'function', 'name', 'deferred', 'maxLatency', 'events', 'oldest', 'queued',
+        'count', 'total', 'maximum', 'samples', 'strikes', 'quarantined',
+    )
+
+    def __init__(self, reference, function, name, deferred=False, maxLatency=kDefaultMaxLatency):
+        # A weakref to the instance of a method or to a function
+        self.reference = reference
+        # For a method, the function to call on the instance. For a function this is None
+        self.function = function
+        # A readable name, so we can tell people which tool a slow listener belongs to
+        self.name = name
+
+        self.deferred = deferred
+        self.maxLatency = maxLatency
+        # The events waiting to be delivered, keyed by signal and node so repeats replace each other
+        self.events = OrderedDict()
+        # When the oldest waiting event arrived
+        self.oldest = None
+        # Whether the listener is in the manager's list of listeners waiting to be delivered to
+        self.queued = False
+
+        # How many times it's been called, how long that took in total and the slowest call
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        # The times of the most recent calls. A deque with a maxlen forgets the oldest ones for us
+        self.samples = deque(maxlen=kSampleSize)
+        # How many calls in a row went over the time budget, and whether we've stopped calling it because of that
+        self.strikes = 0
+        self.quarantined = False
+
+    def stats(self):
+        """Returns the timings of this listener as a dictionary"""
+        samples = sorted(self.samples)
+
+        def percentile(fraction):
+            return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else 0.0
+
+        return {
+            'name': self.name,
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': percentile(0.5),
+            'p99': percentile(0.99),
+            'max': self.maximum,
+            'strikes': self.strikes,
+            'quarantined': self.quarantined,
+        }
 
 
 class SceneCallbackManager(object):
@@ -16,6 +89,9 @@ class SceneCallbackManager(object):
     The Callback Manager is in charge of keeping track of all callbacks registered in the scene
     and acting as a go between for all scene messages and any callbacks registered.
 
+    It also handles node added and removed messages, and attribute changes on individual nodes.
+    Maya only ever sees one callback per signal, node type or node, no matter how many listeners we have.
+
     This can help prevent bad callbacks from stalling operations or killing Maya.
     Base on PySignal: https://github.com/dgovil/PySignal
     """
@@ -32,10 +108,38 @@ class SceneCallbackManager(object):
     def __init__(self):
         super(SceneCallbackManager, self).__init__()
 
-        # Our two dictionaries will store the callbacks and also the ids of our internal handlers
-        self.__callbacks = {}
+        # For each signal we keep an ordered dictionary of its listeners, so they're called in the order they registered
+        # The key tells us who the listener is, so checking if it's already registered is a single dictionary lookup
+        # The value is a (reference, function) pair that we can call straight away
+        self.__listeners = {}
+        # Calling through the dictionary every time is slow, so for each signal we also keep a tuple of its listeners
+        # This snapshot is only rebuilt when a listener is added or removed, rather than every time the signal fires
+        self.__dispatch = {}
+        # Several signals can share the same Maya callback, like the attributes of a single node.
+        # So each signal belongs to a source, and each source owns the ids of the Maya callbacks it registered
+        self.__signalSources = {}
+        self.__sourceSignals = {}
         self.__callbackIDs = {}
 
+        # The deferred listeners that have events waiting, and whether we've asked Maya to deliver them yet
+        self.__pending = []
+        self.__flushScheduled = False
+        # Maya might not be idle again until long after a burst of events ends, so we also set a timer
+        # for when the oldest event has to be delivered by. These are when that is, and the id of the timer callback
+        self.__deadline = None
+        self.__deadlineCallback = None
+        # These count the events deferred listeners were sent, how many they were given after removing repeats,
+        # and how many calls it took to give them
+        self.deferredCounts = {'received': 0, 'delivered': 0, 'deliveries': 0}
+
+        # The watchdog quarantines listeners that take longer than timeBudget seconds, maxStrikes times in a row
+        # The budget is None by default, which means we only record the timings and never quarantine anything
+        self.timeBudget = None
+        self.maxStrikes = kDefaultStrikes
+
+        # The nice names of the scene messages, so our stats are readable
+        self.__signalNames = {}
+
         # For each signal in the MSceneMessage callback, create a register and deregister method
         for signalName in dir(om.MSceneMessage):
             # All the signal names start with k
@@ -49,6 +153,7 @@ class SceneCallbackManager(object):
 
             # We make a nice name by removing the k from the start
             niceName = signalName[1:]
+            self.__signalNames[signal] = niceName
 
             # Then we create the registration and deregistration functions for each signal
             # These will internally just call the same functions but with the signal as a provided attribute
@@ -64,137 +169,444 @@ class SceneCallbackManager(object):
                 partial(self.__deregister, signal=signal)
             )
 
-    def __register(self, callback, signal):
+    @staticmethod
+    def listenerKey(callback):
+        """
+        Returns the key we store a callback under.
+        A method is stored by the instance it belongs to and its function, and a function is stored by itself.
+        We use the id of the instance rather than the instance, since we don't want to keep it alive.
+        """
+        if inspect.ismethod(callback):
+            return id(callback.__self__), callback.__func__
+        return id(callback), None
+
+    def __register(self, callback, signal, deferred=False, maxLatency=kDefaultMaxLatency):
+        # Scene messages are their own source, and each one gets a single Maya callback
+        self.__addListener(callback, signal, signal, partial(self.__connectScene, signal), deferred, maxLatency)
+
+    def __deregister(self, callback, signal=None):
+        self.__removeListener(callback, signal)
+
+    def registerNodeAdded(self, callback, nodeType='dependNode', deferred=False, maxLatency=kDefaultMaxLatency):
+        """Calls the callback with the node whenever a node of the given type is added"""
+        signal = ('nodeAdded', nodeType)
+        self.__addListener(callback, signal, signal, partial(self.__connectDG, signal), deferred, maxLatency)
+
+    def deregisterNodeAdded(self, callback, nodeType='dependNode'):
+        self.__removeListener(callback, ('nodeAdded', nodeType))
+
+    def registerNodeRemoved(self, callback, nodeType='dependNode', deferred=False, maxLatency=kDefaultMaxLatency):
+        """Calls the callback with the node whenever a node of the given type is removed"""
+        signal = ('nodeRemoved', nodeType)
+        self.__addListener(callback, signal, signal, partial(self.__connectDG, signal), deferred, maxLatency)
+
+    def deregisterNodeRemoved(self, callback, nodeType='dependNode'):
+        self.__removeListener(callback, ('nodeRemoved', nodeType))
+
+    def registerAttributeChanged(self, node, callback, attribute=None, deferred=False, maxLatency=kDefaultMaxLatency):
+        """
+        Calls the callback with (message, plug, otherPlug) whenever an attribute of the node changes
+
+        :param node: The MObject or name of the node to watch
+        :param callback: The function or method to call
+        :param attribute: The long or short name of an attribute to only be told about changes to that attribute
+        :param deferred: Whether to collect the changes and deliver them together. See __addListener
+        :param maxLatency: The longest a deferred change waits before it's delivered
+        """
+        node, nodeHash, attribute = self.__nodeSignal(node, attribute)
+        # Every attribute of a node shares the same source, so the node only ever has one Maya callback
+        # Once it's registered, listening to another attribute of the node is just a dictionary insert
+        source = ('node', nodeHash)
+        self.__addListener(
+            callback, ('attributeChanged', nodeHash, attribute), source,
+            partial(self.__connectNode, om.MObjectHandle(node), nodeHash), deferred, maxLatency
+        )
+
+    def deregisterAttributeChanged(self, node, callback, attribute=None):
+        node, nodeHash, attribute = self.__nodeSignal(node, attribute)
+        self.__removeListener(callback, ('attributeChanged', nodeHash, attribute))
+
+    @staticmethod
+    def __nodeSignal(node, attribute):
+        # We let people give us the name of a node as well, since that's what cmds gives back
+        if not isinstance(node, om.MObject):
+            selection = om.MSelectionList()
+            selection.add(node)
+            node = selection.getDependNode(0)
+
+        # Attributes can be given by their long or short name, so we always store them by their long name
+        if attribute is not None:
+            attributeObject = om.MFnDependencyNode(node).attribute(attribute)
+            if attributeObject.isNull():
+                raise ValueError('Node has no attribute called %s' % attribute)
+            attribute = om.MFnAttribute(attributeObject).name
+
+        # The hash code of a node handle stays the same for as long as the node exists
+        return node, om.MObjectHandle(node).hashCode(), attribute
+
+    @staticmethod
+    def listenerName(callback):
+        """Returns a readable name for a callback, like module.Class.method"""
+        if inspect.ismethod(callback):
+            owner = type(callback.__self__)
+            return '%s.%s.%s' % (owner.__module__, owner.__name__, callback.__func__.__name__)
+        return '%s.%s' % (getattr(callback, '__module__', None), getattr(callback, '__name__', repr(callback)))
+
+    def __addListener(self, callback, signal, source, connect, deferred=False, maxLatency=kDefaultMaxLatency):
+        """
+        Adds a listener to a signal
+
+        :param callback: The function or method to call
+        :param signal: The key of the signal the listener is for
+        :param source: The key of the Maya callback the signal comes from
+        :param connect: A function that registers the Maya callbacks for the source and returns their ids
+        :param deferred: If True, events are collected and repeats of the same signal and node are dropped.
+                         When Maya is next idle the callback is called once with a list of (signal, args) tuples.
+        :param maxLatency: The longest a deferred event waits. If Maya isn't idle by then,
+                           everything collected is delivered without waiting for it
+        """
         # When we're passed a callback to register, lets first check if its a callable function or class
         # If we can't call it, don't allow it to be registered
         if not callable(callback):
             raise ValueError('Cannot register non-callable object')
 
-        # Next we get the list of already registered callbacks to this signal
-        # If it doesn't have any we'll assign it an empty list
-        callbackList = self.__callbacks.setdefault(signal, [])
-
-        # If the list is empty, it means we haven't registered it
-        # So lets register the signal with our handler
-        if not callbackList:
-            # We'll create a handler for this signal
-            # It will just call our own handler function internally
-            handler = partial(self.__handler, signal=signal)
-            # We'll register this handler
-            # It will give us back an ID
-            id = om.MSceneMessage.addCallback(signal, handler)
-            # We'll store this id in our dict
-            self.__callbackIDs[signal] = id
-
-        # Now we can store our callback in the list
-        # We only support functions and methods
+        # Next we get the listeners already registered to this signal
+        # If it doesn't have any we'll assign it an empty dictionary
+        listeners = self.__listeners.setdefault(signal, OrderedDict())
+
+        # If it's already registered there's nothing to do
+        key = self.listenerKey(callback)
+        if key in listeners:
+            return
+
+        # If nothing is using the source yet, it means we haven't registered it with Maya
+        # So lets register our handlers and store the ids it gives back
+        if source not in self.__callbackIDs:
+            self.__callbackIDs[source] = connect()
+        self.__signalSources[signal] = source
+        self.__sourceSignals.setdefault(source, set()).add(signal)
+
+        # We only ever hold weak references to our listeners.
+        # In a regular dictionary, if we hold onto the value, it prevents Python cleaning up the data if its unused
+        # Weakrefs let us refer to things but also let them be cleaned up.
+        # The second argument to the weakref is called when the object is cleaned up, so we can forget about it then
+        finalize = partial(self.__finalize, signal=signal, key=key)
+
+        # We support functions and methods
         # Two other types of callables are lambdas and partials
         # Check out the implementation in PySignal : https://github.com/dgovil/PySignal/
         # Try implementing those yourself here
-
-        # First we check if its a method on a class
-        if inspect.ismethod(callback):
-            # If it is a method, we store its self, which tells us the instance it belongs to
-            callbackSelf = callback.__self__
-            # We create a WeakKeyDictionary
-            # This is a dictionary that allows its keys to stop existing even if it refers to them
-            # In a regular dictionary, if we hold onto the value, it prevents Python cleaning up the data if its unused
-            # Weakrefs let us refer to things but also let them be cleaned up
-            callbackDict = weakref.WeakKeyDictionary()
-            # In this dictionary we'll store the instance as the key, and the method function as the value
-            callbackDict[callbackSelf] = callback.__func__
-
-            # We then add this to the callback list
-            if callbackDict not in callbackList:
-                callbackList.append(callbackDict)
-        else:
-            # The other case is if its just a function
-            # In this case we store it as a weakref reference
-            # This also lets the object stop existing if needed
-            callbackRef = weakref.ref(callback)
-            # We'll store this in the list as well
-            if callbackRef not in callbackList:
-                callbackList.append(callbackRef)
-
-    def __deregister(self, callback, signal=None):
-        # To deregister, we do most of the same work as registering
-        # We get the list
-        callbackList = self.__callbacks.setdefault(signal, [])
-
-        # Then we check if its a method
         if inspect.ismethod(callback):
-            callbackSelf = callback.__self__
-            for callbackDict in callbackList:
-                # We then go through every callback to see if its the same callback
-                if not isinstance(callbackDict, weakref.WeakKeyDictionary):
-                    continue
-
-                if not callbackSelf in callbackDict:
-                    continue
-                if not callbackDict[callbackSelf] == callback.__func__:
-                    continue
-
-                # Finally once we'fe figured that out, we remove it
-                callbackList.remove(callbackDict)
-                break
+            # For a method we keep a weakref to the instance it belongs to, and the function to call on it
+            reference, function = weakref.ref(callback.__self__, finalize), callback.__func__
         else:
-            try:
-                # In the case of a function we just create a new weakref and try and remove it.
-                callbackList.remove(weakref.ref(callback))
-            except ValueError:
-                pass
-
-        # If the callback list is now empty, then we will also deregister the handler
-        # This prevents it being called if its not really in use
-        if not callbackList:
-            # So first we remove it from the MSceneMessage callback list
-            om.MSceneMessage.removeCallback(self.__callbackIDs[signal])
-            # Then we delete it from both our internal dictionaries
-            self.__callbacks.pop(signal)
-            self.__callbackIDs.pop(signal)
+            # For a function, we just keep a weakref to the function itself
+            reference, function = weakref.ref(callback, finalize), None
+
+        listeners[key] = Listener(reference, function, self.listenerName(callback), deferred, maxLatency)
+        self.__compile(signal)
+
+    def __removeListener(self, callback, signal):
+        # To deregister, we find the listener by its key and remove it
+        listeners = self.__listeners.get(signal)
+        if not listeners:
+            return
+
+        listener = listeners.pop(self.listenerKey(callback), None)
+        if listener is not None:
+            # Anything it hadn't been given yet is thrown away
+            listener.events.clear()
+            self.__compile(signal)
+
+    def __connectScene(self, signal):
+        # We'll create a handler for this signal
+        # It will just call our own handler function internally
+        handler = partial(self.__handler, signal=signal)
+        return [om.MSceneMessage.addCallback(signal, handler)]
+
+    def __connectDG(self, signal):
+        # The DG messages only pass the node and the client data, so we just pass on the node
+        message, nodeType = signal
+        handler = partial(self.__nodeHandler, signal=signal)
+        if message == 'nodeAdded':
+            return [om.MDGMessage.addNodeAddedCallback(handler, nodeType)]
+        return [om.MDGMessage.addNodeRemovedCallback(handler, nodeType)]
+
+    def __connectNode(self, handle, nodeHash):
+        # Each node we watch gets one callback for all of its attributes,
+        # and one to tell us when it's destroyed so we can stop watching it
+        node = handle.object()
+        return [
+            om.MNodeMessage.addAttributeChangedCallback(node, partial(self.__attributeHandler, nodeHash=nodeHash)),
+            om.MNodeMessage.addNodeDestroyedCallback(node, partial(self.__nodeDestroyed, nodeHash=nodeHash)),
+        ]
+
+    def __finalize(self, reference, signal, key):
+        # This is called when the instance or function of a listener is cleaned up
+        listeners = self.__listeners.get(signal)
+        # We make sure the listener is the one that died, in case the key has been registered again since
+        if listeners and key in listeners and listeners[key].reference is reference:
+            listeners.pop(key).events.clear()
+            self.__compile(signal)
+
+    def __compile(self, signal):
+        # We build a new tuple rather than changing the old one.
+        # That way if a listener registers or deregisters while we're dispatching,
+        # the loop that's running carries on with the tuple it started with.
+        listeners = self.__listeners.get(signal)
+        if listeners:
+            self.__dispatch[signal] = tuple(listeners.values())
+            return
+
+        self.__dispatch.pop(signal, None)
+        self.__listeners.pop(signal, None)
+
+        # If no signal is using the source anymore, then we will also deregister its Maya callbacks
+        # This prevents them being called if they're not really in use
+        source = self.__signalSources.pop(signal, None)
+        signals = self.__sourceSignals.get(source)
+        if signals is None:
+            return
+        signals.discard(signal)
+        if not signals:
+            self.__sourceSignals.pop(source)
+            om.MMessage.removeCallbacks(self.__callbackIDs.pop(source))
 
     def __handler(self, *args, **kwargs):
-        # For the handler, we handle it in much the same way again
         # First we get the signal from the kwargs. We'll also remove it from the kwargs using pop
         signal = kwargs.pop('signal')
+        self.emit(signal, *args, **kwargs)
+
+    def __nodeHandler(self, node, clientData, signal):
+        self.emit(signal, node)
+
+    def __attributeHandler(self, message, plug, otherPlug, clientData, nodeHash):
+        # Listeners for the whole node get told about every attribute
+        wholeNode = ('attributeChanged', nodeHash, None)
+        self.emit(wholeNode, message, plug, otherPlug)
+
+        # If nobody is listening to a specific attribute of this node, we don't need to look up the attribute's name
+        signals = self.__sourceSignals.get(('node', nodeHash), ())
+        if len(signals) == (wholeNode in signals):
+            return
+
+        # Then we tell the listeners for this attribute, and for its parent if it's part of a compound like translate
+        attribute = plug
+        while True:
+            signal = ('attributeChanged', nodeHash, om.MFnAttribute(attribute.attribute()).name)
+            if signal in self.__dispatch:
+                self.emit(signal, message, plug, otherPlug)
+            if not attribute.isChild:
+                break
+            attribute = attribute.parent()
+
+    def __nodeDestroyed(self, clientData, nodeHash):
+        # The node is gone, so we forget every listener that was watching it
+        # Once the last signal is compiled, the node's Maya callbacks are removed too
+        for signal in list(self.__sourceSignals.get(('node', nodeHash), ())):
+            for listener in self.__listeners[signal].values():
+                listener.events.clear()
+            self.__listeners[signal].clear()
+            self.__compile(signal)
+
+    def emit(self, signal, *args, **kwargs):
+        """Calls every listener of the signal with the given arguments"""
+        eventKey = None
+        # Everything we need is already in the snapshot, so this is just one loop
+        for listener in self.__dispatch.get(signal, ()):
+            if listener.quarantined:
+                continue
+            if listener.deferred:
+                # We only work out which node the event is for if someone actually wants to collect it
+                if eventKey is None:
+                    eventKey = self.eventKey(signal, args)
+                self.__defer(listener, eventKey, signal, args)
+            else:
+                self.__call(listener, args, kwargs)
+
+    def __call(self, listener, args, kwargs):
+        # Calling a weakref gives us back the object if it still exists or None if it doesn't
+        target = listener.reference()
+        if target is None:
+            return
+
+        # If it fails to run, we put it inside a try/except to prevent it breaking other tools
+        start = timeit.default_timer()
+        try:
+            if listener.function is None:
+                target(*args, **kwargs)
+            else:
+                # We reconstitute the method using the instance and function
+                listener.function(target, *args, **kwargs)
+        except:
+            # However we should also always report the error back so its known
+            logger.exception('Failed to run callback %s', listener.name)
+        elapsed = timeit.default_timer() - start
+
+        listener.count += 1
+        listener.total += elapsed
+        listener.samples.append(elapsed)
+        if elapsed > listener.maximum:
+            listener.maximum = elapsed
+
+        # Catching errors isn't enough, a slow callback can still stall every file open
+        # So if a listener keeps going over its budget we stop calling it until someone re-enables it
+        if self.timeBudget is None:
+            return
+        if elapsed <= self.timeBudget:
+            listener.strikes = 0
+            return
+        listener.strikes += 1
+        if listener.strikes >= self.maxStrikes:
+            listener.quarantined = True
+            logger.warning(
+                'Quarantined callback %s: it took longer than %.3fs %d times in a row (last call %.3fs). '
+                'Use SceneCallbackManager.instance().reenable() to call it again',
+                listener.name, self.timeBudget, listener.strikes, elapsed
+            )
 
-        # We get the callback list
-        callbackList = self.__callbacks[signal]
-        # Then loop through it
-        for callback in callbackList:
-            # If it's a WeakKeyDictionary, we know its a class method
-            if isinstance(callback, weakref.WeakKeyDictionary):
-                # We then reconstitute the class method using the instance and function
-                for obj, method in callback.items():
-                    # If it fails to run, we put it inside a try/except to prevent it breaking other tools
-                    try:
-                        method(obj, *args, **kwargs)
-                    except:
-                        # However we should also always report the error back so its known
-                        logger.exception('Failed to run method callback')
-
+    @staticmethod
+    def eventKey(signal, args):
+        """
+        Returns the key we use to find repeated events.
+        Events for the same signal and the same node replace each other while they wait to be delivered.
+        """
+        if args and isinstance(args[0], om.MObject):
+            return signal, om.MObjectHandle(args[0]).hashCode()
+        return signal, None
+
+    def __defer(self, listener, eventKey, signal, args):
+        self.deferredCounts['received'] += 1
+        now = timeit.default_timer()
+
+        if not listener.events:
+            listener.oldest = now
+            # The deadline starts with the first event, so it's met even if no more arrive
+            self.__scheduleDeadline(now + listener.maxLatency)
+        # A listener that was delivered to early is still in the list, and only needs to be in it once
+        if not listener.queued:
+            listener.queued = True
+            self.__pending.append(listener)
+        # If the same event is already waiting, it keeps its place but we keep the newest arguments
+        listener.events[eventKey] = (signal, args)
+
+        if now - listener.oldest >= listener.maxLatency:
+            # It's been waiting too long, so we don't wait for Maya to be idle
+            self.__deliver(listener)
+        elif not self.__flushScheduled:
+            # executeDeferred runs our function the next time Maya is idle, which is after the current burst
+            self.__flushScheduled = True
+            utils.executeDeferred(self.flushDeferred)
+
+    def __deliver(self, listener):
+        events = list(listener.events.values())
+        listener.events.clear()
+        if not events:
+            return
+
+        self.deferredCounts['delivered'] += len(events)
+        self.deferredCounts['deliveries'] += 1
+        self.__call(listener, (events,), {})
+
+    def flushDeferred(self):
+        """Delivers every deferred event that's waiting right now"""
+        self.__flushScheduled = False
+        self.__cancelDeadline()
+        # A listener could cause more events while we deliver, so we swap in a new list before we start
+        pending, self.__pending = self.__pending, []
+        for listener in pending:
+            listener.queued = False
+            self.__deliver(listener)
+
+    def __scheduleDeadline(self, deadline):
+        """Makes sure we deliver by the deadline, unless we've already got a timer for an earlier one"""
+        if self.__deadline is not None and self.__deadline <= deadline:
+            return
+        self.__cancelDeadline()
+        self.__deadline = deadline
+        # A timer with no delay would fire over and over, so it always waits a little
+        delay = max(deadline - timeit.default_timer(), 0.01)
+        self.__deadlineCallback = om.MTimerMessage.addTimerCallback(delay, self.__deadlineReached)
+
+    def __cancelDeadline(self):
+        if self.__deadlineCallback is not None:
+            om.MMessage.removeCallback(self.__deadlineCallback)
+        self.__deadline = self.__deadlineCallback = None
+
+    def __deadlineReached(self, *args):
+        """Delivers to the listeners whose events have waited as long as they can, and sets a timer for the rest"""
+        # Timer callbacks repeat, but we only want this one once
+        self.__cancelDeadline()
+        now = timeit.default_timer()
+        pending, self.__pending = self.__pending, []
+        for listener in pending:
+            if listener.events and now - listener.oldest >= listener.maxLatency:
+                self.__deliver(listener)
+            if listener.events:
+                self.__pending.append(listener)
             else:
-                # For functions, we convert the reference from a weakref ref, to a ref by calling it
-                # This gives us back the function if it still exists or None if it doesn't
-                callback = callback()
-                # If it's None, it means it no longer exists so ignore it
-                if callback is None:
-                    continue
-
-                # Then we can simply call it report any errors
-                try:
-                    callback(*args, **kwargs)
-                except:
-                    logger.exception('Failed to run function callback')
+                listener.queued = False
+
+        deadlines = [listener.oldest + listener.maxLatency for listener in self.__pending]
+        if deadlines:
+            self.__scheduleDeadline(min(deadlines))
+
+    def listenerCount(self, signal):
+        """Returns how many listeners are registered to the signal"""
+        return len(self.__dispatch.get(signal, ()))
+
+    def signalName(self, signal):
+        """Returns a readable name for a signal"""
+        if isinstance(signal, tuple):
+            return '/'.join(str(part) for part in signal)
+        return self.__signalNames.get(signal, str(signal))
+
+    def setTimeBudget(self, budget, strikes=kDefaultStrikes):
+        """
+        Sets how long a listener can take before it gets a strike.
+        After the given number of strikes in a row the listener is quarantined. A budget of None turns this off.
+        """
+        self.timeBudget = budget
+        self.maxStrikes = strikes
+
+    def reenable(self, callback=None):
+        """Lets quarantined listeners be called again. If no callback is given, every listener is re-enabled"""
+        key = None if callback is None else self.listenerKey(callback)
+        for listeners in self.__listeners.values():
+            for listenerKey, listener in listeners.items():
+                if key is None or listenerKey == key:
+                    listener.quarantined = False
+                    listener.strikes = 0
+
+    def listenerStats(self):
+        """Returns the timings of every listener, slowest in total first"""
+        stats = []
+        for signal, listeners in self.__listeners.items():
+            for listener in listeners.values():
+                listenerStats = listener.stats()
+                listenerStats['signal'] = self.signalName(signal)
+                stats.append(listenerStats)
+        stats.sort(key=lambda listenerStats: listenerStats['total'], reverse=True)
+        return stats
+
+    def dumpStats(self, path):
+        """Writes the timings of every listener to a JSON file"""
+        with open(path, 'w') as f:
+            json.dump({
+                'timeBudget': self.timeBudget,
+                'maxStrikes': self.maxStrikes,
+                'deferred': self.deferredCounts,
+                'listeners': self.listenerStats(),
+            }, f, indent=2, sort_keys=True)
 
     def testMethod(self, *args):
         """This is just a test method for our test functions below"""
-        print "Test Method"
+        print("Test Method")
 
 
 def testFunction(*args):
     """This is just a simple test function to test our runTests function below"""
-    print "testFunction", args
+    print("testFunction", args)
 
 
 def runTests():
@@ -0,0 +1,114 @@
+# This benchmark measures how long the CreatedNodesContext takes to track and give back the nodes of a large import
+# It writes out a scene with 100,000 nodes, imports it inside a context, deletes some of the imported nodes,
+# and then times getting the nodes back in a few different ways.
+#
+# It also times the way the context used to check nodes, by building every path and adding it to a selection list,
+# so we can see how much checking the handles saves.
+#
+# Each of these is registered with the benchmark runner in Intro/benchmark.py, so it can be run inside Maya or in mayapy:
+#
+#   mayapy -m Intro.benchmark createdNodes.import createdNodes.legacyPaths createdNodes.paths
+from __future__ import division, print_function
+
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+
+import maya.cmds as cmds
+from maya.api import OpenMaya as om
+
+from Intro import benchmark
+from Utilities.createdNodesContext import CreatedNodesContext
+
+# How many nodes the scene we import has
+kNodeCount = 100000
+
+# The fraction of the imported nodes we delete before getting them back
+kDeletedFraction = 0.1
+
+# A context that's still capturing, with the nodes it captured from an import
+Imported = namedtuple('Imported', 'context nodes path')
+
+
+def writeScene(path, count):
+    """Writes a Maya ASCII file with count nodes in it, half of them transforms and half of them DG nodes"""
+    cmds.file(new=True, force=True)
+
+    # A modifier creates all the nodes in one go, which is much faster than calling createNode count times
+    modifier = om.MDagModifier()
+    for i in range(count // 2):
+        modifier.createNode('transform')
+        modifier.createDGNode('network')
+    modifier.doIt()
+
+    cmds.file(rename=path)
+    cmds.file(save=True, type='mayaAscii', force=True)
+    cmds.file(new=True, force=True)
+
+
+def writeTempScene():
+    """Writes the scene to a new temporary folder and returns the path of the scene"""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'createdNodesBenchmark.ma')
+    writeScene(path, kNodeCount)
+    return path
+
+
+def removeTempScene(path):
+    cmds.file(new=True, force=True)
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+def importScene():
+    """Imports the scene inside a context and deletes some of what it made, leaving the context open"""
+    path = writeTempScene()
+    context = CreatedNodesContext()
+    context.__enter__()
+    cmds.file(path, i=True)
+
+    # Delete some of the nodes so there's something for the checks to skip
+    nodes = list(context.iterNodes())
+    if kDeletedFraction:
+        cmds.delete([CreatedNodesContext.nodePath(node) for node in nodes[::int(1 / kDeletedFraction)]])
+    return Imported(context, nodes, path)
+
+
+def closeImport(imported):
+    imported.context.__exit__(None, None, None)
+    removeTempScene(imported.path)
+
+
+def legacyNodes(nodes):
+    """Checks the nodes the way CreatedNodesContext used to, by building their paths and adding them to a selection"""
+    validNodes = []
+    sel = om.MSelectionList()
+    for node in nodes:
+        if node.isNull():
+            continue
+        path = CreatedNodesContext.nodePath(node)
+        try:
+            sel.add(path)
+        except:
+            continue
+        validNodes.append(path)
+    return validNodes
+
+
+# Importing is slow and every import adds more nodes to the scene, so we only time a few of them
+@benchmark.register('createdNodes.import', setup=writeTempScene, teardown=removeTempScene, warmup=0, repeat=3)
+def importInContext(path):
+    with CreatedNodesContext():
+        cmds.file(path, i=True)
+
+
+# These compare the ways of getting the captured nodes back
+# The legacy case is how CreatedNodesContext used to check nodes, by building every path and adding it to a selection
+benchmark.register('createdNodes.legacyPaths', setup=importScene, teardown=closeImport, repeat=10)(
+    lambda imported: legacyNodes(imported.nodes))
+benchmark.register('createdNodes.paths', setup=importScene, teardown=closeImport, repeat=10)(
+    lambda imported: imported.context.nodes())
+benchmark.register('createdNodes.objects', setup=importScene, teardown=closeImport, repeat=10)(
+    lambda imported: list(imported.context.iterNodes()))
+benchmark.register('createdNodes.count', setup=importScene, teardown=closeImport, repeat=10)(
+    lambda imported: sum(1 for _ in imported.context.iterHandles()))
@@ -1,79 +1,224 @@
+from __future__ import print_function
+
+import logging
+
 import maya.cmds as cmds
 from maya.api import OpenMaya as om
 
+from Utilities import mayaLogging
+
+logger = mayaLogging.getLogger(__name__, logging.WARNING)
+
+
+class NodeAddedDispatcher(object):
+    """
+    Contexts are often nested inside each other, like a tool running inside a publish inside a batch job.
+    If each of them registered its own callback, every node created would call one Python handler per context.
+    Instead they all share this dispatcher, which only registers a single callback while any context is active.
+    """
+
+    def __init__(self):
+        # The node lists of every active context
+        # We keep them in a tuple that we replace rather than change,
+        # so a context entering or exiting while we're handling a node can't break the loop
+        self.__buffers = ()
+        self.__callbackID = None
+
+    def add(self, buffer, buckets=None):
+        """
+        Starts adding every new node to the buffer, registering our callback if this is the first one
+
+        :param buffer: The list to add the handle of every new node to
+        :param buckets: An optional dictionary of {apiType: [handle, ...]} to also sort the new nodes into
+        """
+        self.__buffers += ((buffer, buckets),)
+        if self.__callbackID is None:
+            # We care about all nodes that are subclasses of dependNode, essentially every single node
+            self.__callbackID = om.MDGMessage.addNodeAddedCallback(self.__handler, 'dependNode')
+
+    def remove(self, buffer):
+        """Stops adding nodes to the buffer, removing our callback if it was the last one"""
+        # We compare with "is" since two different contexts can have buffers that are equal
+        self.__buffers = tuple(entry for entry in self.__buffers if entry[0] is not buffer)
+        if not self.__buffers and self.__callbackID is not None:
+            om.MDGMessage.removeCallback(self.__callbackID)
+            self.__callbackID = None
+
+    def activeCount(self):
+        """Returns how many contexts are currently capturing nodes"""
+        return len(self.__buffers)
+
+    def __handler(self, node, *args):
+        # The nodes given to this function are MObjects
+        # We only wrap it in a handle once, no matter how many contexts are active
+        handle = om.MObjectHandle(node)
+        # Likewise we only ask for its type once, and only if a context wants it
+        apiType = None
+        for buffer, buckets in self.__buffers:
+            buffer.append(handle)
+            if buckets is not None:
+                if apiType is None:
+                    apiType = node.apiType()
+                buckets.setdefault(apiType, []).append(handle)
+
+
+# Every context uses this one dispatcher
+dispatcher = NodeAddedDispatcher()
+
 
 class CreatedNodesContext(object):
     """The CreatedNodesContext keeps track of all the objects created during the execution of the code block"""
 
-    def __init__(self):
+    def __init__(self, byType=False, rollbackOnError=False):
+        """
+        :param byType: Also sort the nodes by their type as they're created, so nodesOfType doesn't have to check every node
+        :param rollbackOnError: Delete every node that was created if the code block raises an error
+        """
         # We create a list to hold on to the nodes creates
-        self.__nodes = []
-        # as well as the id of the handler we'll register
-        self.__handlerID = None
+        # We store them as MObjectHandles, which can tell us cheaply if the node they point to still exists
+        self.__handles = []
+        # If we're sorting by type, this holds {apiType: [handle, ...]}
+        self.__buckets = {} if byType else None
+        self.__rollbackOnError = rollbackOnError
 
     def __enter__(self):
-        # When we enter the context, we'll register the handler
-        # We care about all nodes that are subclasses of dependNode, essentially every single node
-        self.__handlerID = om.MDGMessage.addNodeAddedCallback(self.__handler, 'dependNode')
+        # When we enter the context, we ask the shared dispatcher to add new nodes to our list
+        dispatcher.add(self.__handles, self.__buckets)
         # Then we return this class
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        # When we exit, we'll deregister the handler from the ID we stored
-        om.MDGMessage.removeCallback(self.__handlerID)
+        # When we exit, we'll stop the dispatcher adding to our list
+        dispatcher.remove(self.__handles)
+
+        # If something went wrong, we can clean up everything the code block made
+        if exc_val and self.__rollbackOnError:
+            try:
+                self.rollback()
+            except Exception:
+                # The error from the code block is the one that matters, so we don't let this one replace it
+                logger.exception('Could not roll back the nodes created before the error')
+
         # We'll also empty out our list so as to prevent any errors from holding onto objects
-        self.__nodes = []
+        self.__handles = []
+        if self.__buckets is not None:
+            self.__buckets = {}
 
         # Then if there was an error, we'll raise it
         if exc_val:
             raise exc_val
 
-    def __handler(self, node, *args):
-        # The handler is simple and stores the given nodes in the nodes list
-        # The nodes given to this function are MObjects
-        self.__nodes.append(node)
+    @staticmethod
+    def isValid(handle):
+        """
+        Returns whether the node the handle points to still exists.
+        isAlive tells us the node is still in memory, and isValid tells us it hasn't been deleted.
+        A deleted node can stay alive so it can be brought back by undo, so we need to check both.
+        """
+        return handle.isAlive() and handle.isValid()
+
+    @staticmethod
+    def nodePath(node):
+        """Returns the name we'd use to refer to the node with cmds"""
+        # If the node is a dagNode (checked by seeing if it has that function set)
+        # Then we need to get its shortest unique path
+        if node.hasFn(om.MFn.kDagNode):
+            # The partial path is the shortest unique name to the object
+            # A full path can be wasteful in terms of memory
+            # But just the name can lead to ambiguity if multiple objects share the name
+            # The partial path instead gives us the shortest name we know to be unique
+            return om.MFnDagNode(node).partialPathName()
+        # If it isn't a DAGNode, then it's a DG node and always has a unique name
+        return om.MFnDependencyNode(node).name()
+
+    def iterHandles(self):
+        """Yields the handle of every node created so far that still exists"""
+        isValid = self.isValid
+        for handle in self.__handles:
+            if isValid(handle):
+                yield handle
+
+    def iterNodes(self, paths=False):
+        """
+        Yields every node created so far that still exists.
+        These are MObjects by default. Building the path of each node is much slower,
+        so we only do it if paths is True.
+        """
+        for handle in self.iterHandles():
+            node = handle.object()
+            yield self.nodePath(node) if paths else node
 
     def nodes(self):
-        # The nodes function will filter through the nodes and make sure we only give back valid nodes
-        validNodes = []
-
-        # The selection list will help us validate whether a node exists or not
-        sel = om.MSelectionList()
-
-        # Lets iterate through the node list we've captured
-        for node in self.__nodes:
-            # If the node is null, it means the MObject no longer points to valid data so we can ignore it
-            if node.isNull():
-                continue
-
-            # We now have to get the path of the node
-            # If the node is a dagNode (checked by seeing if it has that function set)
-            # Then we need to get its shortest unique path
-            if node.hasFn(om.MFn.kDagNode):
-                # We create an MFnDagNode for it
-                dag = om.MFnDagNode(node)
-                # The partial path is the shortest unique name to the object
-                # A full path can be wasteful in terms of memory
-                # But just the name can lead to ambiguity if multiple objects share the name
-                # The partial path instead gives us the shortest name we know to be unique
-                path = dag.partialPathName()
-            else:
-                # If it isn't a DAGNode, then it's a DG node and always has a unique name
-                dg = om.MFnDependencyNode(node)
-                path = dg.name()
-
-            # Even once we have the path, it may not exist anymore (if deleted etc)
-            # We'll try and add it to the selection list and if it fails to add then we'll assume it no longer exists
-            try:
-                sel.add(path)
-            except:
+        """Returns the paths of every node created so far that still exists"""
+        return list(self.iterNodes(paths=True))
+
+    def iterNodesOfType(self, apiType, paths=False):
+        """
+        Yields every node of the given type created so far that still exists, like om.MFn.kMesh for meshes.
+        The type must match exactly, so asking for om.MFn.kDagNode won't give back meshes.
+        """
+        if self.__buckets is not None:
+            # We sorted the nodes as they came in, so we only need to look at the nodes of this type
+            handles = self.__buckets.get(apiType, ())
+        else:
+            # Otherwise we have to check the type of every node
+            handles = (handle for handle in self.__handles if handle.object().apiType() == apiType)
+
+        isValid = self.isValid
+        for handle in handles:
+            if isValid(handle):
+                node = handle.object()
+                yield self.nodePath(node) if paths else node
+
+    def nodesOfType(self, apiType):
+        """Returns the paths of every node of the given type created so far that still exists"""
+        return list(self.iterNodesOfType(apiType, paths=True))
+
+    def rollback(self):
+        """
+        Deletes every node created so far that still exists, all at once with a single delete command.
+        Creating the nodes was undoable, so deleting them is too. Undoing the rollback brings them all back.
+
+        :return: How many nodes were deleted
+        """
+        dgNodes = []
+        dagNodes = []
+        for handle in self.iterHandles():
+            node = handle.object()
+            fn = om.MFnDependencyNode(node)
+            # Locked and default nodes can't be deleted, and trying would stop the whole delete
+            if fn.isLocked or fn.isDefaultNode:
                 continue
-
-            # Then add it to the validNodes list
-            validNodes.append(path)
-
-        # Finally return the node list
-        return validNodes
+            (dagNodes if node.hasFn(om.MFn.kDagNode) else dgNodes).append(handle)
+
+        # Deleting a DAG node deletes everything under it, and we can't delete a node twice
+        # So we only delete the DAG nodes that don't have a parent we're deleting too
+        dagHashes = set(handle.hashCode() for handle in dagNodes)
+        topmost = [handle for handle in dagNodes if not self.hasCapturedParent(handle.object(), dagHashes)]
+
+        # DG nodes go first, newest first, so nodes are deleted before the nodes they were built from
+        # Building the names is slow, but it means the delete goes in the undo queue like any other command
+        names = [self.nodePath(handle.object()) for handle in list(reversed(dgNodes)) + topmost]
+        if names:
+            cmds.delete(names)
+
+        self.__handles[:] = []
+        if self.__buckets is not None:
+            self.__buckets.clear()
+        return len(names)
+
+    @staticmethod
+    def hasCapturedParent(node, hashes):
+        """Returns whether any parent of the DAG node, all the way up to the world, has its hash in hashes"""
+        fn = om.MFnDagNode(node)
+        while fn.parentCount():
+            parent = fn.parent(0)
+            if parent.apiType() == om.MFn.kWorld:
+                return False
+            if om.MObjectHandle(parent).hashCode() in hashes:
+                return True
+            fn = om.MFnDagNode(parent)
+        return False
 
 
 def test():
@@ -83,4 +228,4 @@ def test():
         cmds.polySphere()
         cmds.spaceLocator()
         cmds.delete(cubes)
-        print "Created the following nodes:\n\t%s" % ('\n\t'.join(cnc.nodes()))
+        print("Created the following nodes:\n\t%s" % ('\n\t'.join(cnc.nodes())))
@@ -0,0 +1,142 @@
+# Reading keyframes one at a time, like api() does in Intro/standalone.py, makes a Python call for every single key.
+# On a crowd scene with millions of keys that takes minutes.
+#
+# Instead we can ask Maya for the keys of every curve at once with a single keyframe query,
+# and put them straight into numpy arrays. Every curve's keys go into the same array one after the other,
+# and a separate array of offsets tells us where each curve starts and ends.
+#
+# from Utilities import keyframeArrays
+# keys = keyframeArrays.extract(['animCurveTA'])
+# # The times of the keys on the third curve
+# keys.times[keys.offsets[2]:keys.offsets[3]]
+# # Every frame that has a key on any curve
+# keys.uniqueTimes
+from array import array
+from collections import namedtuple
+
+import maya.cmds as cmds
+from maya.api import OpenMaya as om
+from maya.api import OpenMayaAnim as oma
+
+# numpy isn't always available in Maya, so we fall back to Python arrays without it
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The Python array type we keep offsets in without numpy. It has to be 64 bit, since 'l' is only 32 bit on Windows
+# Python 2 doesn't have 'q' though, so there we have to make do with 'l'
+try:
+    kIndexTypecode = array('q').typecode
+except ValueError:
+    kIndexTypecode = 'l'
+
+# The curve types that animate transforms. TA curves are rotations, TL are translations and TU are everything else
+kTransformCurveTypes = ('animCurveTA', 'animCurveTL', 'animCurveTU')
+
+# The tangent values we read with keyTangent, and the names we give them
+kTangentFlags = (
+    ('inAngle', 'inAngles'),
+    ('outAngle', 'outAngles'),
+    ('inWeight', 'inWeights'),
+    ('outWeight', 'outWeights'),
+)
+
+KeyframeArrays = namedtuple('KeyframeArrays', [
+    # The names of the curves, in the order their keys are stored
+    'curves',
+    # The keys of curve i are from offsets[i] to offsets[i + 1], so there's one more offset than there are curves
+    'offsets',
+    # The time and value of every key, in the current time and angle units
+    'times', 'values',
+    # The tangents of every key, or None if they weren't asked for
+    'inAngles', 'outAngles', 'inWeights', 'outWeights',
+    # Every time that has a key on any curve, sorted
+    'uniqueTimes',
+])
+
+
+def toArray(values, dtype='float64'):
+    """Turns a list of numbers into a numpy array, or a Python array if we don't have numpy"""
+    if numpy is not None:
+        return numpy.array(values, dtype=dtype)
+    return array('d' if dtype == 'float64' else kIndexTypecode, values)
+
+
+def keyCounts(curves):
+    """Returns how many keys each of the curves has, using the API so we don't run a command per curve"""
+    selection = om.MSelectionList()
+    for curve in curves:
+        selection.add(curve)
+
+    curveFn = oma.MFnAnimCurve()
+    counts = []
+    for i in range(selection.length()):
+        curveFn.setObject(selection.getDependNode(i))
+        counts.append(curveFn.numKeys)
+    return counts
+
+
+def query(curves, **flags):
+    """Runs a single keyframe query over every curve, or keyTangent if given a tangent flag"""
+    command = cmds.keyTangent if any(flag in flags for flag, _ in kTangentFlags) else cmds.keyframe
+    return command(curves, query=True, **flags) or []
+
+
+def extract(types=('animCurveTA',), curves=None, tangents=True):
+    """
+    Reads the keys of every anim curve of the given types into arrays
+
+    :param types: The node types of the curves to read
+    :param curves: The curves to read. If given, types is ignored
+    :param tangents: Whether to read the tangents of each key as well
+    :return: A KeyframeArrays
+    """
+    if curves is None:
+        curves = cmds.ls(type=list(types)) or []
+
+    counts = keyCounts(curves)
+    offsets = [0]
+    for count in counts:
+        offsets.append(offsets[-1] + count)
+
+    # If there aren't any curves, keyframe would query the selected objects instead, so we skip the queries
+    if curves:
+        times = query(curves, timeChange=True)
+        values = query(curves, valueChange=True)
+    else:
+        times = values = []
+
+    # The offsets only line up if Maya gave us the keys of each curve in the order we asked for them
+    # The total alone can't tell us that, since two curves swapped around still have the same number of keys
+    # So we also ask which curves the query went through, and make sure it's ours in the same order
+    if len(times) != offsets[-1]:
+        raise RuntimeError('Expected %d keys but the keyframe query gave back %d' % (offsets[-1], len(times)))
+    queried = query(curves, name=True) if curves else []
+    # Curves without any keys don't add anything to the arrays, so it doesn't matter if the query skips them
+    expected = [curve for curve, count in zip(curves, counts) if count]
+    keyed = set(expected)
+    if [curve for curve in queried if curve in keyed] != expected:
+        raise RuntimeError('The keyframe query did not give back the keys of each curve in the order they were asked for')
+
+    tangentArrays = dict((name, None) for _, name in kTangentFlags)
+    if tangents:
+        for flag, name in kTangentFlags:
+            tangentArrays[name] = toArray(query(curves, **{flag: True}) if curves else [])
+
+    times = toArray(times)
+    if numpy is not None:
+        # unique sorts the times and removes duplicates in one vectorized step
+        uniqueTimes = numpy.unique(times)
+    else:
+        uniqueTimes = toArray(sorted(set(times)))
+
+    return KeyframeArrays(
+        curves=curves,
+        offsets=toArray(offsets, dtype='int64'),
+        times=times,
+        values=toArray(values),
+        uniqueTimes=uniqueTimes,
+        **tangentArrays
+    )
+
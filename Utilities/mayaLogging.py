@@ -0,0 +1,174 @@
+# MGlobal.displayInfo, displayWarning and displayError write straight to the Script Editor.
+# Each call is slow, so a callback or deformer that logs something for every node can end up spending
+# more time printing than working.
+#
+# The MayaHandler is a logging handler that collects log messages and writes them to the Script Editor together,
+# either when Maya is next idle, when enough of them have built up, or when the oldest has waited long enough.
+# Messages that repeat are only written once, with a count of how many times they happened, like "(x1000)".
+# That includes errors, so a callback that fails for every node writes one line rather than one per node.
+# In batch mode, like mayapy, there's no Script Editor so it writes to stderr instead.
+# Maya is never idle there, so a timer writes everything out every few seconds in case Maya crashes before it exits.
+#
+# Rather than calling MGlobal directly, get a logger from here and use it like any other logger:
+#
+# from Utilities import mayaLogging
+# logger = mayaLogging.getLogger(__name__)
+# logger.info('Hello, World!')
+from __future__ import print_function
+
+import logging
+import sys
+import threading
+import timeit
+from collections import OrderedDict
+
+from maya import utils
+from maya.api import OpenMaya as om
+
+# By default we write everything out once this many records have built up, even if Maya isn't idle yet
+kDefaultCapacity = 500
+
+# By default we also write everything out once the oldest record has waited this many seconds
+kDefaultFlushInterval = 2.0
+
+# The format of every message. Maya already shows the level, so we don't add it ourselves
+kFormat = '%(name)s: %(message)s'
+
+
+def isBatchMode():
+    """Returns whether Maya is running without an interface, like in mayapy or a render farm job"""
+    return om.MGlobal.mayaState() != om.MGlobal.kInteractive
+
+
+class MayaHandler(logging.Handler):
+    """A logging handler that writes to the Script Editor in batches"""
+
+    def __init__(self, capacity=kDefaultCapacity, flushInterval=kDefaultFlushInterval):
+        """
+        :param capacity: How many records to collect before writing them out straight away
+        :param flushInterval: How many seconds a record can wait before everything is written out
+        """
+        logging.Handler.__init__(self)
+        self.capacity = capacity
+        self.flushInterval = flushInterval
+        self.setFormatter(logging.Formatter(kFormat))
+
+        # {(level, message): count}, in the order each message was first logged
+        self.__pending = OrderedDict()
+        self.__pendingCount = 0
+        # When the oldest pending record was logged
+        self.__pendingSince = None
+        self.__flushScheduled = False
+        self.__timer = None
+
+        self.batchMode = isBatchMode()
+
+        # These count how many records we've been given, and how many times we've actually written to Maya
+        self.received = 0
+        self.writes = 0
+
+    def emit(self, record):
+        try:
+            message = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        # Anything at warning level or below is shown as info, since Maya only has the three levels
+        level = record.levelno
+        if level >= logging.ERROR:
+            level = logging.ERROR
+        elif level < logging.WARNING:
+            level = logging.INFO
+
+        now = timeit.default_timer()
+        if self.__pendingSince is None:
+            self.__pendingSince = now
+
+        key = (level, message)
+        self.__pending[key] = self.__pending.get(key, 0) + 1
+        self.__pendingCount += 1
+        self.received += 1
+
+        # Maya may be busy for a long time, so we don't only rely on it becoming idle
+        if self.__pendingCount >= self.capacity or now - self.__pendingSince >= self.flushInterval:
+            self.flush()
+        elif self.__flushScheduled:
+            pass
+        elif self.batchMode:
+            # Nothing writes to Maya in batch mode, so it's safe to flush from another thread
+            self.__flushScheduled = True
+            self.__timer = threading.Timer(self.flushInterval, self.flush)
+            # A daemon timer doesn't keep mayapy running after the script is done. close() writes out what's left
+            self.__timer.daemon = True
+            self.__timer.start()
+        else:
+            # executeDeferred runs the function the next time Maya is idle
+            self.__flushScheduled = True
+            utils.executeDeferred(self.flush)
+
+    def flush(self):
+        """Writes out every record we've collected"""
+        # The batch mode timer calls this from its own thread, so we hold the handler's lock while we write
+        self.acquire()
+        try:
+            self.__flushScheduled = False
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+            if not self.__pending:
+                return
+
+            pending = self.__pending
+            self.__pending = OrderedDict()
+            self.__pendingCount = 0
+            self.__pendingSince = None
+
+            # Messages next to each other at the same level are joined into a single write
+            lines = []
+            lastLevel = None
+            for (level, message), count in pending.items():
+                if count > 1:
+                    message = '%s (x%d)' % (message, count)
+                if level != lastLevel and lines:
+                    self.write(lastLevel, '\n'.join(lines))
+                    lines = []
+                lines.append(message)
+                lastLevel = level
+            self.write(lastLevel, '\n'.join(lines))
+        finally:
+            self.release()
+
+    def write(self, level, text):
+        self.writes += 1
+        if self.batchMode:
+            sys.stderr.write(text + '\n')
+        elif level >= logging.ERROR:
+            om.MGlobal.displayError(text)
+        elif level >= logging.WARNING:
+            om.MGlobal.displayWarning(text)
+        else:
+            om.MGlobal.displayInfo(text)
+
+    def close(self):
+        self.flush()
+        logging.Handler.close(self)
+
+
+# Every logger from getLogger shares the one handler, so their messages are batched together
+handler = None
+
+
+def getLogger(name, level=logging.INFO):
+    """Returns a logger that writes to the Script Editor through the shared MayaHandler"""
+    global handler
+    if handler is None:
+        handler = MayaHandler()
+
+    logger = logging.getLogger(name)
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+        logger.setLevel(level)
+        # Our handler already writes to Maya, so we don't want the root logger printing it again
+        logger.propagate = False
+    return logger
@@ -0,0 +1,205 @@
+# Finding every node of a type with cmds.ls(type=...) or MItDependencyNodes looks at every node in the scene.
+# That's fine once, but some tools do it dozens of times per operation, and in a scene with 500,000 nodes it adds up.
+#
+# The node type index looks at every node once, and sorts them by type.
+# After that it keeps itself up to date by listening for nodes being added and removed,
+# and builds itself again whenever a scene is opened or a new one is made.
+#
+# from Utilities.nodeTypeIndex import NodeTypeIndex
+# index = NodeTypeIndex.instance()
+# index.start()
+# meshes = index.nodesOfType('mesh')
+# shapes = index.nodesWithFn(om.MFn.kShape)
+import logging
+
+from maya.api import OpenMaya as om
+
+from Utilities import mayaLogging
+from Utilities.callbackManager import SceneCallbackManager
+
+logger = mayaLogging.getLogger(__name__, logging.WARNING)
+
+
+class NodeTypeIndex(object):
+    """Keeps track of every node in the scene, sorted by its type name"""
+
+    # Like the callback manager, we only ever want one of these
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        cls._instance = cls._instance or cls()
+        return cls._instance
+
+    def __init__(self):
+        # {typeName: {hashCode: MObjectHandle}}
+        # A dictionary keyed by the hash code gives us a set of handles that we can add to and remove from quickly
+        self.__byType = {}
+        # {hashCode: typeName}, so when a node is removed we know which type to remove it from
+        self.__typeOf = {}
+        # Whether nodes of a type have a function set, which we work out once for each pair
+        self.__hasFn = {}
+
+        self.__running = False
+        # While a file is opening every node is added one at a time, but we'll look at them all at once afterwards
+        self.__paused = False
+
+        # When this is True, every query is checked against a full scan of the scene and any differences are logged
+        # It's very slow, so it's only meant for finding bugs
+        self.checkQueries = False
+
+    def start(self):
+        """Builds the index and starts keeping it up to date"""
+        if self.__running:
+            return
+        self.__running = True
+
+        manager = SceneCallbackManager.instance()
+        manager.registerNodeAdded(self.nodeAdded)
+        manager.registerNodeRemoved(self.nodeRemoved)
+        manager.registerBeforeOpen(self.pause)
+        manager.registerBeforeNew(self.pause)
+        manager.registerAfterOpen(self.rebuild)
+        manager.registerAfterNew(self.rebuild)
+
+        self.rebuild()
+
+    def stop(self):
+        """Stops keeping the index up to date and empties it"""
+        if not self.__running:
+            return
+        self.__running = False
+
+        manager = SceneCallbackManager.instance()
+        manager.deregisterNodeAdded(self.nodeAdded)
+        manager.deregisterNodeRemoved(self.nodeRemoved)
+        manager.deregisterBeforeOpen(self.pause)
+        manager.deregisterBeforeNew(self.pause)
+        manager.deregisterAfterOpen(self.rebuild)
+        manager.deregisterAfterNew(self.rebuild)
+
+        self.__byType.clear()
+        self.__typeOf.clear()
+
+    def pause(self, *args):
+        self.__paused = True
+
+    def ensureCurrent(self):
+        """
+        Rebuilds the index if it's still paused after the file operation that paused it has finished.
+        If an open fails or is cancelled, AfterOpen never fires, so this is the only way we'd find out.
+        """
+        if not self.__paused:
+            return
+        if om.MFileIO.isOpeningFile() or om.MFileIO.isReadingFile() or om.MFileIO.isNewingFile():
+            return
+        logger.warning('Node type index was paused by a file operation that never finished, rebuilding it')
+        self.rebuild()
+
+    def rebuild(self, *args):
+        """Throws away the index and builds it again by looking at every node in the scene"""
+        self.__paused = False
+        self.__byType.clear()
+        self.__typeOf.clear()
+
+        iterator = om.MItDependencyNodes()
+        while not iterator.isDone():
+            self.add(iterator.thisNode())
+            iterator.next()
+
+    def add(self, node):
+        handle = om.MObjectHandle(node)
+        hashCode = handle.hashCode()
+        typeName = om.MFnDependencyNode(node).typeName
+        self.__byType.setdefault(typeName, {})[hashCode] = handle
+        self.__typeOf[hashCode] = typeName
+
+    def remove(self, node):
+        hashCode = om.MObjectHandle(node).hashCode()
+        typeName = self.__typeOf.pop(hashCode, None)
+        if typeName is None:
+            return
+        nodes = self.__byType[typeName]
+        nodes.pop(hashCode, None)
+        if not nodes:
+            self.__byType.pop(typeName)
+
+    def nodeAdded(self, node):
+        if not self.__paused:
+            self.add(node)
+
+    def nodeRemoved(self, node):
+        if not self.__paused:
+            self.remove(node)
+
+    def types(self):
+        """Returns the names of every type that has at least one node in the scene"""
+        self.ensureCurrent()
+        return list(self.__byType)
+
+    def count(self, typeName):
+        """Returns how many nodes of the type there are"""
+        self.ensureCurrent()
+        return len(self.__byType.get(typeName, ()))
+
+    def handlesOfType(self, typeName):
+        """Returns the handles of every node with exactly this type name"""
+        self.ensureCurrent()
+        handles = list(self.__byType.get(typeName, {}).values())
+        if self.checkQueries:
+            self.check()
+        return handles
+
+    def nodesOfType(self, typeName):
+        """Returns every node with exactly this type name, like 'mesh' or 'transform'"""
+        return [handle.object() for handle in self.handlesOfType(typeName) if handle.isValid()]
+
+    def typeHasFn(self, typeName, fn):
+        """Returns whether nodes of the type are compatible with the function set type, like om.MFn.kDagNode"""
+        key = (typeName, fn)
+        hasFn = self.__hasFn.get(key)
+        if hasFn is None:
+            # Every node of a type has the same function sets, so we only need to ask one of them
+            nodes = self.__byType.get(typeName)
+            if not nodes:
+                return False
+            handle = next(iter(nodes.values()))
+            hasFn = self.__hasFn[key] = handle.object().hasFn(fn)
+        return hasFn
+
+    def nodesWithFn(self, fn):
+        """
+        Returns every node compatible with the function set type.
+        This includes every type that inherits from it, so om.MFn.kShape gives back meshes, curves and so on.
+        """
+        self.ensureCurrent()
+        nodes = []
+        for typeName, handles in list(self.__byType.items()):
+            if self.typeHasFn(typeName, fn):
+                nodes.extend(handle.object() for handle in handles.values() if handle.isValid())
+        if self.checkQueries:
+            self.check()
+        return nodes
+
+    def check(self):
+        """
+        Compares the index against a full scan of the scene
+
+        :return: A dictionary of {'missing': [...], 'extra': [...]} node names.
+                 Missing nodes are in the scene but not the index, and extra nodes are in the index but not the scene.
+        """
+        scanned = {}
+        iterator = om.MItDependencyNodes()
+        while not iterator.isDone():
+            node = iterator.thisNode()
+            scanned[om.MObjectHandle(node).hashCode()] = node
+            iterator.next()
+
+        missing = [om.MFnDependencyNode(node).name() for hashCode, node in scanned.items()
+                   if hashCode not in self.__typeOf]
+        extra = ['%s (%s)' % (hashCode, typeName) for hashCode, typeName in self.__typeOf.items()
+                 if hashCode not in scanned]
+
+        if missing or extra:
+            logger.warning('Node type index is out of date: %d missing and %d extra nodes', len(missing), len(extra))
+        return {'missing': missing, 'extra': extra}
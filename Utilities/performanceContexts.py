@@ -0,0 +1,254 @@
+# When we build a lot of things with a script, Maya spends much of its time on work we don't need while we're building:
+# redrawing the viewport, recording undo, re-evaluating the scene, setting keys and printing to the script editor.
+#
+# These contexts turn each of those off for the duration of a code block, and then put back exactly what was there
+# before, even if the code errors.
+#
+# They're safe to nest. Every context of the same kind shares a count of how many are active,
+# so only the outermost one changes Maya's state, and it's only put back when the outermost one exits.
+# We also record how long each suspension lasted, so we can see where the time goes.
+#
+# from Utilities import performanceContexts
+# with performanceContexts.fastBuild():
+#     buildRig()
+from __future__ import print_function
+
+import timeit
+
+import maya.cmds as cmds
+
+# How many times each kind of suspension happened, and how long they lasted in total, keyed by the context's name
+stats = {}
+
+
+class Frame(object):
+    """One level of state that a context has changed, along with what it needs to put it back"""
+    __slots__ = ('key', 'saved', 'started', 'count')
+
+    def __init__(self, key, saved, started):
+        self.key = key
+        self.saved = saved
+        self.started = started
+        # How many contexts are sharing this frame
+        self.count = 1
+
+
+class PerformanceContext(object):
+    """
+    The base class for our contexts.
+    Subclasses implement save, apply and restore, and the base class takes care of nesting and timing them.
+    """
+    # The name we record the timings under
+    name = None
+
+    def __init__(self):
+        # The frames of active contexts, with the newest last.
+        # We set this on the class the first time it's used, so each kind of context has its own stack
+        cls = type(self)
+        if '_stack' not in cls.__dict__:
+            cls._stack = []
+
+    def key(self):
+        """
+        Returns what this context wants to change the state to.
+        A nested context that wants the same thing shares the frame of the one outside it.
+        """
+        return None
+
+    def save(self):
+        """Returns the current state, so we can put it back later"""
+        raise NotImplementedError
+
+    def apply(self):
+        """Changes the state to what this context wants"""
+        raise NotImplementedError
+
+    def restore(self, saved):
+        """Puts back the state returned by save"""
+        raise NotImplementedError
+
+    @classmethod
+    def depth(cls):
+        """Returns how many contexts of this kind are currently active"""
+        return sum(frame.count for frame in cls.__dict__.get('_stack', ()))
+
+    def __enter__(self):
+        stack = type(self)._stack
+        key = self.key()
+
+        # If a context outside us already set the state we want, we just join it
+        if stack and stack[-1].key == key:
+            stack[-1].count += 1
+            return self
+
+        saved = self.save()
+        try:
+            self.apply()
+        except:
+            # If we only got part way through changing things, we put back what we did change
+            self.restore(saved)
+            raise
+        stack.append(Frame(key, saved, timeit.default_timer()))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        stack = type(self)._stack
+        frame = stack[-1]
+        frame.count -= 1
+        if frame.count:
+            return
+
+        # We were the last context using this frame, so we put the state back the way it was
+        stack.pop()
+        try:
+            self.restore(frame.saved)
+        finally:
+            elapsed = timeit.default_timer() - frame.started
+            record = stats.setdefault(self.name, {'count': 0, 'total': 0.0, 'longest': 0.0, 'last': 0.0})
+            record['count'] += 1
+            record['total'] += elapsed
+            record['longest'] = max(record['longest'], elapsed)
+            record['last'] = elapsed
+        # Returning nothing lets any error from the code block carry on as normal
+
+
+class SuspendRefresh(PerformanceContext):
+    """Stops the viewport from redrawing"""
+    name = 'refresh'
+
+    def save(self):
+        return cmds.refresh(query=True, suspend=True)
+
+    def apply(self):
+        cmds.refresh(suspend=True)
+
+    def restore(self, saved):
+        cmds.refresh(suspend=saved)
+
+
+class DisableUndo(PerformanceContext):
+    """Stops Maya recording undo"""
+    name = 'undo'
+
+    def save(self):
+        return cmds.undoInfo(query=True, state=True)
+
+    def apply(self):
+        # stateWithoutFlush keeps the existing undo queue, so everything before the block can still be undone
+        cmds.undoInfo(stateWithoutFlush=False)
+
+    def restore(self, saved):
+        cmds.undoInfo(stateWithoutFlush=saved)
+
+
+class EvaluationMode(PerformanceContext):
+    """Switches the evaluation manager to another mode, which is off by default. Off is the same as the DG mode."""
+    name = 'evaluationMode'
+
+    # People often call the off mode DG mode, since that's what Maya falls back to
+    kAliases = {'dg': 'off'}
+
+    def __init__(self, mode='off'):
+        super(EvaluationMode, self).__init__()
+        self.mode = self.kAliases.get(mode.lower(), mode.lower())
+
+    def key(self):
+        return self.mode
+
+    def save(self):
+        return cmds.evaluationManager(query=True, mode=True)[0]
+
+    def apply(self):
+        cmds.evaluationManager(mode=self.mode)
+
+    def restore(self, saved):
+        cmds.evaluationManager(mode=saved)
+
+
+class SuspendAutoKey(PerformanceContext):
+    """Stops Maya setting keys automatically when attributes change"""
+    name = 'autoKey'
+
+    def save(self):
+        return cmds.autoKeyframe(query=True, state=True)
+
+    def apply(self):
+        cmds.autoKeyframe(state=False)
+
+    def restore(self, saved):
+        cmds.autoKeyframe(state=saved)
+
+
+class SilenceScriptEditor(PerformanceContext):
+    """Stops results, info and warnings being printed to the script editor. Errors are still shown."""
+    name = 'scriptEditor'
+
+    kSuppressFlags = ('suppressResults', 'suppressInfo', 'suppressWarnings')
+
+    def save(self):
+        saved = dict((flag, cmds.scriptEditorInfo(query=True, **{flag: True})) for flag in self.kSuppressFlags)
+        saved['commandEcho'] = cmds.commandEcho(query=True, state=True)
+        return saved
+
+    def apply(self):
+        cmds.scriptEditorInfo(**dict((flag, True) for flag in self.kSuppressFlags))
+        cmds.commandEcho(state=False)
+
+    def restore(self, saved):
+        saved = dict(saved)
+        cmds.commandEcho(state=saved.pop('commandEcho'))
+        cmds.scriptEditorInfo(**saved)
+
+
+class Combined(object):
+    """Enters several contexts in order, and exits them in reverse order"""
+
+    def __init__(self, *contexts):
+        self.contexts = contexts
+        self.__entered = []
+
+    def __enter__(self):
+        try:
+            for context in self.contexts:
+                context.__enter__()
+                self.__entered.append(context)
+        except:
+            # If one of them fails, we still need to exit the ones we already entered
+            self.__exitEntered(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.__exitEntered(exc_type, exc_val, exc_tb)
+
+    def __exitEntered(self, exc_type, exc_val, exc_tb):
+        # Every context gets to clean up, even if one of the others fails to
+        error = None
+        while self.__entered:
+            context = self.__entered.pop()
+            try:
+                context.__exit__(exc_type, exc_val, exc_tb)
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+
+def fastBuild(evaluationMode='off'):
+    """Returns a context that turns off everything that slows down building lots of nodes"""
+    return Combined(
+        SilenceScriptEditor(),
+        SuspendAutoKey(),
+        DisableUndo(),
+        EvaluationMode(evaluationMode),
+        SuspendRefresh(),
+    )
+
+
+def suspensionStats():
+    """Returns a copy of how long each kind of context has kept things suspended"""
+    return dict((name, dict(record)) for name, record in stats.items())
+
+
+def resetStats():
+    stats.clear()
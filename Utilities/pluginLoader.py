@@ -0,0 +1,307 @@
+# Each of the plugins in this project is loaded on its own with cmds.loadPlugin.
+# That's fine while we're writing them, but once we have lots of them Maya startup gets slower and slower,
+# especially on a render farm where most of them are never used.
+#
+# This module loads all our plugins from one manifest and times how long each one takes to import and to register.
+# It can also load them lazily: instead of loading everything at startup,
+# it puts small stand-ins in place of their commands and node types, and only loads a plugin when it's first needed.
+# Files that use our nodes list the plugins they need with requires statements, so we put our plugins on
+# MAYA_PLUG_IN_PATH and let Maya load just the ones each file needs.
+#
+# Our plugins live in folders alongside modules that aren't plugins, and Maya would list every one of those as a plugin.
+# So instead Maya loads a tiny plugin file we write for each plugin in the manifest, into a folder of their own.
+# Each one imports the real plugin and times it, however it was loaded.
+#
+# To load everything now, for example from userSetup.py:
+#
+# from Utilities import pluginLoader
+# pluginLoader.loadAll()
+# pluginLoader.report()
+#
+# Or to only load plugins when they're used:
+#
+# from Utilities import pluginLoader
+# pluginLoader.install(lazy=True)
+from __future__ import print_function
+
+import importlib
+import os
+import sys
+import tempfile
+import timeit
+import zlib
+from collections import namedtuple, OrderedDict
+
+from maya import cmds
+
+# Each plugin is described by the name Maya knows it by, the module it lives in,
+# and the commands and node types it registers
+Plugin = namedtuple('Plugin', ['name', 'module', 'commands', 'nodes'])
+
+kManifest = (
+    Plugin('helloWorldCmd', 'Commands.helloWorldCmd', ('hello',), ()),
+    Plugin('distributeCmd', 'Commands.distributeCmd', ('distribute',), ()),
+    Plugin('minMaxNode', 'Nodes.minMaxNode', (), ('minMax',)),
+    Plugin('pushDeformer', 'Nodes.pushDeformer', (), ('push',)),
+    Plugin('characterRoot', 'Scene.characterRoot', (), ('characterRoot',)),
+    Plugin('customLocator', 'Scene.customLocator', (), ('customLocator',)),
+)
+
+# The root of the project, which every module path in the manifest is relative to
+kRootDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The folder we write the plugin files Maya loads to. Each copy of the project gets its own
+kPluginDir = os.path.join(
+    tempfile.gettempdir(), 'mayaPlugins_%08x' % (zlib.crc32(kRootDir.encode('utf-8')) & 0xffffffff)
+)
+
+# What each of those files contains. They hand everything over to entryPoints below
+kPluginFile = '''# Written by Utilities/pluginLoader.py so Maya can load the %(name)s plugin. Any changes will be written over
+import sys
+if %(root)r not in sys.path:
+    sys.path.append(%(root)r)
+from Utilities import pluginLoader
+globals().update(pluginLoader.entryPoints(%(name)r))
+'''
+
+# How long a plugin took to import, and then how long its initializePlugin took to register everything
+Timing = namedtuple('Timing', ['importTime', 'registerTime'])
+
+# These let us look up a plugin by its name, or by the node types it provides
+plugins = OrderedDict((plugin.name, plugin) for plugin in kManifest)
+nodePlugins = dict((node, plugin) for plugin in kManifest for node in plugin.nodes)
+
+# How long each plugin took to load as a Timing, in the order they were loaded
+timings = OrderedDict()
+
+# The stand-ins we put in maya.cmds while installed lazily, and the original commands they replaced
+_stubs = {}
+_originals = {}
+# What MAYA_PLUG_IN_PATH was before we added our plugins to it
+_originalPluginPath = None
+
+
+def pluginPath(plugin):
+    """Returns the path of the file Maya should load for the plugin, writing it first if it needs to be"""
+    path = os.path.join(kPluginDir, plugin.name + '.py')
+    contents = kPluginFile % {'name': plugin.name, 'root': kRootDir}
+    try:
+        with open(path) as f:
+            if f.read() == contents:
+                return path
+    except IOError:
+        pass
+
+    if not os.path.isdir(kPluginDir):
+        os.makedirs(kPluginDir)
+    # Other Maya sessions might be reading it, so we write to a file of our own and then swap it in
+    temporary = '%s.%d' % (path, os.getpid())
+    with open(temporary, 'w') as f:
+        f.write(contents)
+    try:
+        os.rename(temporary, path)
+    except OSError:
+        # Windows won't rename over a file that exists, which means another session has just written it
+        os.remove(temporary)
+    return path
+
+
+def entryPoints(name):
+    """
+    Imports the real module of a plugin and returns what the plugin file Maya loads needs to act as it.
+    Both the import and initializePlugin are timed, whether we loaded the plugin or a file's requires statement did.
+    """
+    plugin = plugins[name]
+    start = timeit.default_timer()
+    module = importlib.import_module(plugin.module)
+    importTime = timeit.default_timer() - start
+
+    def initializePlugin(mobject):
+        start = timeit.default_timer()
+        module.initializePlugin(mobject)
+        timings[name] = Timing(importTime, timeit.default_timer() - start)
+
+    points = {
+        'initializePlugin': initializePlugin,
+        'uninitializePlugin': module.uninitializePlugin,
+        # So pluginModule can find the real module from the plugin file
+        'pluginModule': module,
+    }
+    # Maya checks for this to know the plugin uses the new API
+    if hasattr(module, 'maya_useNewAPI'):
+        points['maya_useNewAPI'] = module.maya_useNewAPI
+    return points
+
+
+def isLoaded(plugin):
+    return cmds.pluginInfo(plugin.name, query=True, loaded=True)
+
+
+def loadPlugin(name):
+    """
+    Loads a plugin from the manifest if it isn't loaded already, and records how long it took
+
+    :param name: The name of the plugin, like 'pushDeformer'
+    :return: True if the plugin was loaded, False if it already was
+    """
+    plugin = plugins[name]
+    if isLoaded(plugin):
+        return False
+
+    # The plugin file times itself, so loads from a file's requires statement are timed the same way
+    cmds.loadPlugin(pluginPath(plugin))
+    return True
+
+
+def pluginModule(name):
+    """
+    Returns the module of a loaded plugin, so we can change its settings.
+    Maya runs the plugin file under its own name, like customLocator rather than Scene.customLocator.
+    If it loaded one of our plugin files, that gives us the real module. But if it loaded the plugin straight from
+    its own file, the copy Maya is actually using isn't the one we'd get by importing it ourselves.
+    """
+    plugin = plugins[name]
+    loaded = sys.modules.get(plugin.name)
+    if loaded is not None:
+        return getattr(loaded, 'pluginModule', loaded)
+    return importlib.import_module(plugin.module)
+
+
+def loadAll():
+    """Loads every plugin in the manifest and returns how long each one took"""
+    for name in plugins:
+        loadPlugin(name)
+    return timings
+
+
+def addPluginPaths():
+    """
+    Writes the plugin files for every plugin in the manifest and adds their folder to MAYA_PLUG_IN_PATH.
+    When a file with a requires statement for one of our plugins is opened, imported or referenced,
+    Maya finds it there and loads it, so we only ever load the plugins a file actually needs.
+    The folder only has the plugins in the manifest, so none of the other modules show up as plugins.
+    """
+    global _originalPluginPath
+    if _originalPluginPath is None:
+        _originalPluginPath = os.getenv('MAYA_PLUG_IN_PATH', '')
+
+    for plugin in kManifest:
+        pluginPath(plugin)
+
+    paths = [path for path in os.getenv('MAYA_PLUG_IN_PATH', '').split(os.pathsep) if path]
+    if kPluginDir not in paths:
+        paths.append(kPluginDir)
+    os.environ['MAYA_PLUG_IN_PATH'] = os.pathsep.join(paths)
+
+
+def report():
+    """Prints how long each plugin took to import and register, slowest first"""
+    if not timings:
+        print('No plugins have been loaded by the plugin loader')
+        return
+
+    print('%-16s %10s %10s %10s' % ('Plugin', 'Import', 'Register', 'Total'))
+    for name, timing in sorted(timings.items(), key=lambda item: -sum(item[1])):
+        print('%-16s %8.1fms %8.1fms %8.1fms' % (
+            name, timing.importTime * 1000, timing.registerTime * 1000, sum(timing) * 1000
+        ))
+    importTime = sum(timing.importTime for timing in timings.values())
+    registerTime = sum(timing.registerTime for timing in timings.values())
+    print('%-16s %8.1fms %8.1fms %8.1fms' % (
+        'All plugins', importTime * 1000, registerTime * 1000, (importTime + registerTime) * 1000
+    ))
+
+
+def commandStub(plugin, command):
+    """Makes a stand-in for a plugin command that loads the plugin the first time the command is used"""
+
+    def stub(*args, **kwargs):
+        loadPlugin(plugin.name)
+        # Loading the plugin replaces our stand-in in maya.cmds with the real command
+        real = getattr(cmds, command, None)
+        if real is None or real is stub:
+            raise RuntimeError('Loading %s did not register the %s command' % (plugin.name, command))
+        return real(*args, **kwargs)
+
+    stub.__name__ = command
+    stub.__doc__ = 'Loads the %s plugin and then runs its %s command' % (plugin.name, command)
+    return stub
+
+
+def nodeCreatorStub(original, getType):
+    """
+    Wraps a command that creates nodes, like createNode, so that it loads the plugin for the node type first
+
+    :param original: The original command
+    :param getType: A function that gets the node type out of the arguments given to the command
+    """
+
+    def stub(*args, **kwargs):
+        plugin = nodePlugins.get(getType(args, kwargs))
+        if plugin is not None:
+            loadPlugin(plugin.name)
+        return original(*args, **kwargs)
+
+    stub.__name__ = original.__name__
+    stub.__doc__ = original.__doc__
+    return stub
+
+
+# These get the node type out of the arguments of the commands that create our nodes
+kNodeCreators = {
+    'createNode': lambda args, kwargs: args[0] if args else None,
+    'deformer': lambda args, kwargs: kwargs.get('type', kwargs.get('typ')),
+}
+
+
+def install(lazy=True):
+    """
+    Sets up our plugins.
+    If lazy is False they're all loaded straight away.
+    Otherwise stand-ins are put in place so that each plugin is only loaded when one of its commands or nodes is used.
+    """
+    if not lazy:
+        loadAll()
+        return
+
+    # Commands are easy, we just put a stand-in with the same name in maya.cmds
+    for plugin in kManifest:
+        if isLoaded(plugin):
+            continue
+        for command in plugin.commands:
+            if not hasattr(cmds, command):
+                _stubs[command] = commandStub(plugin, command)
+                setattr(cmds, command, _stubs[command])
+
+    # Nodes don't have a command of their own, so instead we wrap the commands that create them
+    # If we've already wrapped them, we're already installed and there's nothing left to do
+    if _originals:
+        return
+    for command, getType in kNodeCreators.items():
+        _originals[command] = getattr(cmds, command)
+        setattr(cmds, command, nodeCreatorStub(_originals[command], getType))
+
+    # Any file we open, import or reference might have our nodes in it
+    # Rather than loading every plugin before it's read, we let Maya load the ones the file requires
+    addPluginPaths()
+
+
+def uninstall():
+    """Removes any stand-ins we put in place. Plugins that have already been loaded stay loaded."""
+    if not _originals:
+        return
+
+    for command, stub in _stubs.items():
+        # If the plugin was loaded, the real command has replaced our stand-in and we leave it alone
+        if getattr(cmds, command, None) is stub:
+            delattr(cmds, command)
+    _stubs.clear()
+
+    for command, original in _originals.items():
+        setattr(cmds, command, original)
+    _originals.clear()
+
+    global _originalPluginPath
+    if _originalPluginPath is not None:
+        os.environ['MAYA_PLUG_IN_PATH'] = _originalPluginPath
+        _originalPluginPath = None